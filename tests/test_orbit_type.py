@@ -0,0 +1,45 @@
+## author: xin luo
+## create: 2026.10.18
+## des: check the orbit type of the windowed (bbox) reads of utils_main/read_granule.py
+##      against the orbit type of the whole beam.
+
+import os
+import sys
+import numpy as np
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'utils_main'))
+from read_granule import orbit_type, orbit_type_rows
+
+### latitude of the beams (southern hemisphere), the turn point (latitude extreme)
+### is in the middle, at index 0, 1 and the last index, or there is no turn.
+LATS = {'turn_middle': [-80, -82, -84, -86, -88, -86, -84, -82, -80, -78],
+        'turn_0': [-88, -87, -86, -85, -84, -83],
+        'turn_1': [-87, -88, -87, -86, -85, -84],
+        'turn_last': [-80, -82, -84, -86, -87, -88],
+        'turn_last_1': [-80, -82, -84, -86, -88, -87],
+        'no_turn': [-60, -62, -64, -66, -68, -70]}
+BEAMS = [(name + '_' + hemi, sign * np.array(lat, dtype=np.float64))
+            for name, lat in LATS.items() for hemi, sign in [('south', 1), ('north', -1)]]
+
+
+def test_orbit_type_full():
+    i_asc, i_des = orbit_type(np.arange(10.), np.array(LATS['turn_middle'], dtype=float))
+    assert np.array_equal(i_asc, [0, 0, 0, 0, 1, 1, 1, 1, 1, 1])
+    i_asc, i_des = orbit_type(np.arange(6.), np.array(LATS['turn_1'], dtype=float))
+    assert np.array_equal(i_asc, [0, 1, 1, 1, 1, 1])
+    i_asc, i_des = orbit_type(np.arange(6.), -np.array(LATS['turn_1'], dtype=float))
+    assert np.array_equal(i_asc, [1, 0, 0, 0, 0, 0])
+
+
+@pytest.mark.parametrize('name, lat', BEAMS)
+def test_orbit_type_rows(name, lat):
+    time = 1e8 + np.arange(len(lat)) * 0.01
+    i_asc_full, _ = orbit_type(time, lat)
+    for r0 in range(len(lat)):
+        for r1 in range(r0, len(lat) + 1):
+            i_asc, i_des = orbit_type_rows(time, lat, slice(r0, r1))
+            assert np.array_equal(i_asc, i_asc_full[r0:r1]), (name, r0, r1)
+            i_asc, i_des = orbit_type_rows(time, lat, slice(r0, r1), time=time[r0:r1])
+            assert np.array_equal(i_asc, i_asc_full[r0:r1]), (name, r0, r1)
+    assert np.array_equal(orbit_type_rows(time, lat, slice(None))[0], i_asc_full)
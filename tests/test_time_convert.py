@@ -0,0 +1,72 @@
+## author: xin luo
+## create: 2026.10.18
+## des: check utils/time_convert.py against astropy, including the times
+##      on both sides of the leap seconds.
+
+import os
+import sys
+import numpy as np
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.time_convert import (LEAP_DATES, gps2dyr, dyr2gps, gps2utc, utc2gps,
+                                    gps2dt64, dt642gps, dt642dyr, dyr2dt64)
+
+Time = pytest.importorskip('astropy.time').Time
+
+### random gps seconds (1980-2021).
+GPS_RAND = np.random.default_rng(0).uniform(0, 1.3e9, 1000)
+### gps seconds around the leap seconds (the leap second itself, 23:59:60, is excluded),
+### and the random gps seconds.
+GPS_LEAP = Time(LEAP_DATES.astype(str), scale='utc').gps
+GPS_TEST = np.r_[np.concatenate([GPS_LEAP + dt for dt in (-86400, -2.5, -1.25, 0, 0.5, 1.75, 86400)]),
+                 GPS_RAND, 0.]
+
+
+def test_gps2dyr():
+    dyr_ref = Time(GPS_TEST, format='gps').decimalyear
+    ### float64 decimal years resolve np.spacing(2020.) ~ 2.3e-13 yr (~7 us) at this
+    ### epoch, so a few ulp is the tightest meaningful tolerance; the sub-microsecond
+    ### accuracy holds for the gps seconds and datetime64 conversions.
+    assert np.allclose(gps2dyr(GPS_TEST), dyr_ref, rtol=0, atol=1e-12)
+
+
+def test_dyr2gps():
+    dyr = Time(GPS_TEST, format='gps').decimalyear
+    gps_ref = Time(dyr, format='decimalyear', scale='tai').gps
+    ### 1e-12 yr ~ 32 us, the resolution of the decimal year input.
+    assert np.allclose(dyr2gps(dyr), gps_ref, rtol=0, atol=3.2e-5)
+
+
+def test_gps2dt64():
+    dt64_ref = Time(GPS_TEST, format='gps').utc.datetime64
+    diff = (gps2dt64(GPS_TEST) - dt64_ref.astype('datetime64[ns]')).astype(np.int64)
+    assert np.abs(diff).max() <= 1000     # 1 us
+
+
+def test_dt642gps():
+    dt64 = Time(GPS_TEST, format='gps').utc.datetime64
+    gps_ref = Time(dt64, scale='utc').gps
+    assert np.allclose(dt642gps(dt64), gps_ref, rtol=0, atol=1e-6)
+
+
+def test_gps2utc():
+    ### the utc seconds since the gps epoch, i.e., without the leap seconds.
+    utc_ref = (Time(GPS_TEST, format='gps').utc.datetime64 - np.datetime64('1980-01-06T00:00:00')) \
+                                                    / np.timedelta64(1, 's')
+    assert np.allclose(gps2utc(GPS_TEST), utc_ref, rtol=0, atol=1e-6)
+    assert np.allclose(utc2gps(utc_ref), GPS_TEST, rtol=0, atol=1e-6)
+
+
+def test_leap_offset():
+    ### gps - utc increases by 1 s at each leap second.
+    offset = GPS_LEAP - gps2utc(GPS_LEAP)
+    assert np.array_equal(offset, np.arange(1, len(LEAP_DATES) + 1))
+    assert np.array_equal(GPS_LEAP - 1.25 - gps2utc(GPS_LEAP - 1.25), np.arange(len(LEAP_DATES)))
+
+
+def test_round_trip():
+    ### the random times, the times exactly on the leap seconds may be rounded into
+    ### the leap second (23:59:60), which is not representable in datetime64.
+    dyr = gps2dyr(GPS_RAND)
+    assert np.allclose(dyr2gps(dyr), GPS_RAND, rtol=0, atol=3.2e-5)
+    assert np.allclose(dt642dyr(dyr2dt64(dyr)), dyr, rtol=0, atol=1e-12)
@@ -0,0 +1,62 @@
+## author: xin luo
+## create: 2026.10.18
+## des: check the candidate segment pairs of utils/xover_icesat2.py (sorted sweep)
+##      against the brute-force bbox overlap, for the tracks with data gaps.
+
+import os
+import sys
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.xover_icesat2 import sweep_ranges, segment_candidates
+
+
+def gapped_track(x0, y0, x1, y1, num, gaps, seed=0):
+    """ des: points along the line (x0, y0) -> (x1, y1), the points within the gaps
+             (fractions of the track, e.g., cloud gaps) are removed. """
+    rng = np.random.default_rng(seed)
+    f = np.sort(rng.uniform(0, 1, num))
+    keep = np.ones(num, dtype=bool)
+    for g0, g1 in gaps:
+        keep &= (f < g0) | (f > g1)
+    f = f[keep]
+    pts = np.column_stack([x0 + (x1 - x0) * f, y0 + (y1 - y0) * f])
+    return pts + rng.normal(0, 5, pts.shape)
+
+
+def segments(pts):
+    return pts[:-1], pts[1:]
+
+
+def brute_pairs(p0, p1, q0, q1):
+    p_min, p_max = np.minimum(p0, p1), np.maximum(p0, p1)
+    q_min, q_max = np.minimum(q0, q1), np.maximum(q0, q1)
+    overlap = np.all((p_min[:, None] <= q_max[None]) & (q_min[None] <= p_max[:, None]), axis=2)
+    return set(zip(*np.where(overlap)))
+
+
+def test_gapped_tracks():
+    ## ascending (q) and descending (p) tracks crossing each other, with long gaps
+    q = gapped_track(-50000, -200000, 50000, 200000, 20000, [(0.02, 0.3), (0.6, 0.95)], seed=1)
+    p = gapped_track(50000, -200000, -50000, 200000, 20000, [(0.1, 0.45), (0.55, 0.9)], seed=2)
+    p0, p1 = segments(p)
+    q0, q1 = segments(q)
+    pairs = [np.column_stack(pair) for pair in segment_candidates(p0, p1, q0, q1, max_pairs=5000)]
+    pairs = set(map(tuple, np.concatenate(pairs))) if pairs else set()
+    assert pairs == brute_pairs(p0, p1, q0, q1)
+    ## number of the scanned q-segments stays near linear (not N x M)
+    p_min, p_max = np.minimum(p0, p1), np.maximum(p0, p1)
+    q_min, q_max = np.minimum(q0, q1), np.maximum(q0, q1)
+    ax = 0 if np.ptp(q_min[:, 0]) >= np.ptp(q_min[:, 1]) else 1
+    num_scan = sum((hi - lo).sum() for _, lo, hi in sweep_ranges(p_min, p_max, q_min, q_max, ax))
+    assert num_scan < 20 * (len(p0) + len(q0))
+
+
+def test_no_gap_and_empty():
+    q = gapped_track(0, -1000, 0, 1000, 500, [], seed=3)
+    p = gapped_track(-1000, 0, 1000, 0, 500, [], seed=4)
+    p0, p1 = segments(p)
+    q0, q1 = segments(q)
+    pairs = set(map(tuple, np.concatenate([np.column_stack(pair) 
+                        for pair in segment_candidates(p0, p1, q0, q1)])))
+    assert pairs == brute_pairs(p0, p1, q0, q1)
+    assert list(segment_candidates(p0[:0], p1[:0], q0, q1)) == []
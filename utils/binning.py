@@ -1,5 +1,5 @@
-## author: xin luo; 
-## create: 2021.9.19; 
+## author: xin luo;
+## create: 2021.9.19; modify: 2026.10.18
 ## des: 1-dimentional binning, e.g., time-series data binning
 
 import numpy as np
@@ -7,6 +7,9 @@ import numpy as np
 def binning_1d(x, y, xmin=None, xmax=None, dx=1 / 12.,
                             window=3 / 12., interp=False, median=False):
     """ des: 1-dimentional binning, e.g., time-series data binning.
+             the points are sorted once and the window edges are located by
+             searchsorted, mean/count/sum are obtained from prefix sums, and
+             median/mad are computed on the sorted slice of each window.
         args:
             x, y: independent and dependent variable, e.g., time and value of the time series data.
             xmin, xmax: range of the variable x.
@@ -14,50 +17,71 @@ def binning_1d(x, y, xmin=None, xmax=None, dx=1 / 12.,
             window: size of binning window. 3/12 represents 3 month if the unit of x is year
             interp: interpolate bin values to x points. if none, one bin has one value.
             median: median value of the bin values, if not set, the mean value is calculated.
-        return: 
+        return:
             xb, yb: x, y corresponding to in each bin center, or interpolation point
             eb, nb, sb: error, number, sum statics of each bin
     """
+    x, y = np.asarray(x), np.asarray(y)
     if xmin is None:
         xmin = np.nanmin(x)
     if xmax is None:
         xmax = np.nanmax(x)
 
-    steps = np.arange(xmin, xmax, dx)   # time steps
-    bins = [(ti, ti + window) for ti in steps]    #s
+    steps = np.arange(xmin, xmax, dx)   # time steps, start of each window
 
-    N = len(bins)  
-    xb = np.full(N, np.nan)         # times corresponding to bins
+    N = len(steps)
+    xb = 0.5 * (steps + (steps + window))   # times corresponding to bins (center of the time window)
     yb = np.full(N, np.nan)         # values corresponding to bins
     eb = np.full(N, np.nan)         # mads corresponding to bins
     nb = np.full(N, np.nan)         # counts of valid values in bins
     sb = np.full(N, np.nan)         # sum of values in bins
 
-    ## loops for each bin
-    for i in range(N):
-        t1, t2 = bins[i]
-        idx, = np.where((x >= t1) & (x <= t2))
+    ## 1) sort the points by x once (nan x never fall into any window)
+    valid = ~np.isnan(x)
+    x_v, y_v = x[valid], y[valid]
+    isort = np.argsort(x_v, kind='stable')
+    x_s, y_s = x_v[isort], y_v[isort].astype(np.float64)
 
-        if len(idx) == 0:
-            xb[i] = 0.5 * (t1 + t2)     # determine the time of bin as the center of the time window
-            continue                    # finish this loop       
+    ## 2) window edges, window is [t1, t2], both ends included
+    i1 = np.searchsorted(x_s, steps, side='left')
+    i2 = np.searchsorted(x_s, steps + window, side='right')
+    n_pts = i2 - i1                 # number of points (including nan y) in each window
 
-        ybv = y[idx]                    # values in specific bin
+    ## 3) count, sum and mean from prefix sums.
+    ##    values are shifted by a reference to limit the round-off of the cumsum.
+    y_nan = np.isnan(y_s)
+    y_ref = np.nanmean(y_s) if (~y_nan).any() else 0.
+    y_fill = np.where(y_nan, 0., y_s - y_ref)
+    cum_y = np.concatenate(([0.], np.cumsum(y_fill)))
+    cum_n = np.concatenate(([0], np.cumsum(~y_nan)))
+    n_valid = cum_n[i2] - cum_n[i1]
+    sum_valid = cum_y[i2] - cum_y[i1] + n_valid * y_ref
 
-        if median:
-            yb[i] = np.nanmedian(ybv)
-        else:
-            yb[i] = np.nanmean(ybv)
+    ibin, = np.where(n_pts > 0)     # bins containing points
+    nb[ibin] = n_valid[ibin]        # counts of the valid values in bin
+    ## sum of the values in bin, nan if the bin contains nan value (same as np.sum)
+    has_nan = (n_pts - n_valid) > 0
+    i_sum = ibin[~has_nan[ibin]]
+    sb[i_sum] = sum_valid[i_sum]
+    i_mean = ibin[n_valid[ibin] > 0]
+    if not median:
+        yb[i_mean] = sum_valid[i_mean] / n_valid[i_mean]
 
-        xb[i] = 0.5 * (t1 + t2)         # determine the time of the bin
-        eb[i] = 1.4826 * np.nanmedian(np.abs(ybv - np.nanmedian(ybv)))  # mad-based std
-        nb[i] = np.sum(~np.isnan(ybv))  # counts of the valid values in bin
-        sb[i] = np.sum(ybv)             # sum of the values in bin
+    ## 4) median and mad-based std on the partition of each window,
+    ##    the valid values of window i are y_valid[cum_n[i1[i]]:cum_n[i2[i]]]
+    y_valid = y_s[~y_nan]
+    j1, j2 = cum_n[i1], cum_n[i2]
+    for i in i_mean:
+        ybv = y_valid[j1[i]:j2[i]]
+        ybv_med = np.median(ybv)
+        if median:
+            yb[i] = ybv_med
+        eb[i] = 1.4826 * np.median(np.abs(ybv - ybv_med))  # mad-based std
 
-    if interp:  
+    if interp:
         try:
             yb = np.interp(x, xb, yb)     ## interpolate the values to the given time in the bin
-            eb = np.interp(x, xb, eb)     ## interpolate the mad ... 
+            eb = np.interp(x, xb, eb)     ## interpolate the mad ...
             sb = np.interp(x, xb, sb)     ## interpolate the sum of the values ...
             xb = x
         except:
@@ -1,35 +1,185 @@
 ## author: xin luo; 
-## create: 2021.9.19; 
+## create: 2021.9.19; modify: 2026.10.18
 
 
 import numpy as np
 from osgeo import gdal
 from osgeo import osr
+from osgeo import gdal_array
+from collections import OrderedDict
+
+def get_info(RS_Data, window=None, out_size=None):
+    '''
+    des: geo-information of the opened gdal dataset, or of its window.
+    args:
+        window: (row_start, col_start, rows, cols), None: the whole image.
+        out_size: (rows, cols) of the decimated window, None: same to the window.
+    return:
+        img_info: dict, geoextent (x_min, x_max, y_min, y_max), geotrans, geosrs, row, col, bands
+    '''
+    row0, col0, im_row, im_col = window if window else \
+                            (0, 0, RS_Data.RasterYSize, RS_Data.RasterXSize)
+    trans = RS_Data.GetGeoTransform()
+    left = trans[0] + trans[1] * col0 + trans[2] * row0
+    up = trans[3] + trans[4] * col0 + trans[5] * row0
+    out_row, out_col = out_size if out_size else (im_row, im_col)
+    s_row, s_col = im_row / max(out_row, 1), im_col / max(out_col, 1)
+    im_geotrans = (left, trans[1] * s_col, trans[2] * s_row, up, trans[4] * s_col, trans[5] * s_row)
+    right = left + trans[1] * im_col + trans[2] * im_row
+    bottom = up + trans[5] * im_row + trans[4] * im_col
+    extent = (left, right, bottom, up)
+    espg_code = osr.SpatialReference(wkt=RS_Data.GetProjection()).GetAttrValue('AUTHORITY',1)
+    img_info = {'geoextent': extent, 'geotrans':im_geotrans, \
+                'geosrs': espg_code, 'row': out_row, 'col': out_col,\
+                    'bands': RS_Data.RasterCount}
+    return img_info
+
+### block cache of the images: {(name, band, row_block, col_block): block array}
+block_cache = OrderedDict()
+
+def read_block(band, i_row, i_col, block_size, name='', cache=block_cache, cache_size=16):
+    '''
+    des: read one block (i_row, i_col) of the gdal band through the block cache,
+         the least recently used block is dropped when the cache is full.
+    args:
+        name: name of the image (e.g., file path), identifies the blocks in the cache.
+    '''
+    key = (name, band.GetBand(), i_row, i_col)
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+    bh, bw = block_size
+    row0, col0 = i_row * bh, i_col * bw
+    nrow, ncol = min(bh, band.YSize - row0), min(bw, band.XSize - col0)
+    block = band.ReadAsArray(col0, row0, ncol, nrow)
+    cache[key] = block
+    if len(cache) > cache_size:
+        cache.popitem(last=False)
+    return block
+
+### resampling methods of the decimated reading
+RESAMPLE_ALGS = {'nearest': gdal.GRIORA_NearestNeighbour, 'bilinear': gdal.GRIORA_Bilinear, 
+                 'cubic': gdal.GRIORA_Cubic, 'cubicspline': gdal.GRIORA_CubicSpline, 
+                 'lanczos': gdal.GRIORA_Lanczos, 'average': gdal.GRIORA_Average, 
+                 'mode': gdal.GRIORA_Mode, 'gauss': gdal.GRIORA_Gauss}
+
+class Raster:
+    '''
+    des: lazy raster, only the geo-information is read when opened, the pixels
+         (windows, bands, or decimated overview) are read on demand in the native dtype.
+    example:
+        img, img_info = readTiff('scene.tif', lazy=True)
+        img_sub = img[1000:2000, 500:1500, [3, 2, 1]]      # (row, col, band), 0-based bands
+        img_ov, info_ov = img.read_overview(max_size=1024)  # for display
+    '''
+    def __init__(self, path_in, cache_size=64):
+        self.path = path_in
+        self.ds = gdal.Open(path_in)
+        self.info = get_info(self.ds)
+        band = self.ds.GetRasterBand(1)
+        self.dtype = np.dtype(gdal_array.GDALTypeCodeToNumericTypeCode(band.DataType))
+        self.block_size = tuple(band.GetBlockSize()[::-1])    # (rows, cols)
+        self.shape = (self.info['row'], self.info['col'], self.info['bands'])
+        self.cache, self.cache_size = OrderedDict(), cache_size
+
+    def window(self, window=None):
+        ''' des: (row_start, col_start, rows, cols) clipped to the image. '''
+        if window is None:
+            return 0, 0, self.info['row'], self.info['col']
+        row0, col0, nrow, ncol = [int(v) for v in window]
+        row1 = min(row0 + nrow, self.info['row'])
+        col1 = min(col0 + ncol, self.info['col'])
+        row0, col0 = max(row0, 0), max(col0, 0)
+        return row0, col0, max(row1 - row0, 0), max(col1 - col0, 0)
+
+    def read(self, window=None, bands=None):
+        '''
+        des: read the window of the bands, the blocks are read through the block cache 
+             if the window covers less blocks than the cache size.
+        args:
+            window: (row_start, col_start, rows, cols), None: the whole image.
+            bands: list of 0-based band index, None: all bands.
+        return:
+            img: (row, col, band) array, or (row, col) array for single band.
+        '''
+        row0, col0, nrow, ncol = self.window(window)
+        bands = list(range(self.info['bands'])) if bands is None else list(bands)
+        img = np.empty((nrow, ncol, len(bands)), dtype=self.dtype)
+        bh, bw = self.block_size
+        rows_b = range(row0 // bh, (row0 + nrow - 1) // bh + 1) if nrow else []
+        cols_b = range(col0 // bw, (col0 + ncol - 1) // bw + 1) if ncol else []
+        use_cache = len(rows_b) * len(cols_b) <= self.cache_size
+        for i, i_band in enumerate(bands):
+            band = self.ds.GetRasterBand(i_band + 1)
+            if not use_cache:
+                img[:, :, i] = band.ReadAsArray(col0, row0, ncol, nrow)
+                continue
+            for i_row in rows_b:
+                for i_col in cols_b:
+                    block = read_block(band, i_row, i_col, self.block_size, self.path, 
+                                                        self.cache, self.cache_size)
+                    r0, c0 = max(row0, i_row * bh), max(col0, i_col * bw)
+                    r1 = min(row0 + nrow, i_row * bh + block.shape[0])
+                    c1 = min(col0 + ncol, i_col * bw + block.shape[1])
+                    img[r0 - row0:r1 - row0, c0 - col0:c1 - col0, i] = \
+                                block[r0 - i_row * bh:r1 - i_row * bh, c0 - i_col * bw:c1 - i_col * bw]
+        return img[:, :, 0] if len(bands) == 1 else img
+
+    def read_overview(self, max_size=1024, window=None, bands=None, resample='nearest'):
+        '''
+        des: decimated read of the window for display, the longer side is within max_size,
+             gdal reads from the overviews of the image if exist.
+        args:
+            resample: 'nearest', 'average', 'bilinear', ..., see RESAMPLE_ALGS.
+        return:
+            img: (row, col, band) or (row, col) array.
+            img_info: geo-information of the decimated image.
+        '''
+        row0, col0, nrow, ncol = self.window(window)
+        step = max(-(-max(nrow, ncol) // max_size), 1)
+        buf_row, buf_col = -(-nrow // step), -(-ncol // step)
+        bands = list(range(self.info['bands'])) if bands is None else list(bands)
+        if resample.lower() not in RESAMPLE_ALGS:
+            raise ValueError('unknown resample method: %s, available: %s' 
+                                            % (resample, list(RESAMPLE_ALGS)))
+        alg = RESAMPLE_ALGS[resample.lower()]
+        img = np.empty((buf_row, buf_col, len(bands)), dtype=self.dtype)
+        for i, i_band in enumerate(bands):
+            img[:, :, i] = self.ds.GetRasterBand(i_band + 1).ReadAsArray(col0, row0, ncol, nrow, 
+                                buf_xsize=buf_col, buf_ysize=buf_row, resample_alg=alg)
+        img_info = get_info(self.ds, (row0, col0, nrow, ncol), (buf_row, buf_col))
+        return (img[:, :, 0] if len(bands) == 1 else img), img_info
+
+    def __getitem__(self, key):
+        ''' des: numpy-like indexing, img[row_slice, col_slice(, bands)], the steps should be positive. '''
+        key = key if isinstance(key, tuple) else (key,)
+        key = key + (slice(None),) * (3 - len(key))
+        rows, cols, bands = key
+        (row0, row1, row_step), (col0, col1, col_step) = rows.indices(self.info['row']), \
+                                                          cols.indices(self.info['col'])
+        if isinstance(bands, slice):
+            bands = list(range(self.info['bands']))[bands]
+        elif np.isscalar(bands):
+            bands = [bands]
+        img = self.read((row0, col0, row1 - row0, col1 - col0), bands)
+        return img[::row_step, ::col_step]
 
 ### tiff image reading
-def readTiff(path_in):
+def readTiff(path_in, lazy=False):
     '''
+    args:
+        lazy: if True, the pixels are not read, img is a Raster (read on demand, native dtype).
     return: 
         img: numpy array, exent: tuple, (x_min, x_max, y_min, y_max) 
         proj info, and dimentions: (row, col, band)
     '''
+    if lazy:
+        img = Raster(path_in)
+        return img, img.info
     RS_Data=gdal.Open(path_in)
-    im_col = RS_Data.RasterXSize   # 
-    im_row = RS_Data.RasterYSize   # 
-    im_bands =RS_Data.RasterCount  # 
-    im_geotrans = RS_Data.GetGeoTransform()  # 
-    im_proj = RS_Data.GetProjection()  # 
+    img_info = get_info(RS_Data)
+    im_row, im_col, im_bands = img_info['row'], img_info['col'], img_info['bands']
     img_array = RS_Data.ReadAsArray(0, 0, im_col, im_row)  # 
-    left = im_geotrans[0]
-    up = im_geotrans[3]
-    right = left + im_geotrans[1] * im_col + im_geotrans[2] * im_row
-    bottom = up + im_geotrans[5] * im_row + im_geotrans[4] * im_col
-    extent = (left, right, bottom, up)
-    espg_code = osr.SpatialReference(wkt=im_proj).GetAttrValue('AUTHORITY',1)
-
-    img_info = {'geoextent': extent, 'geotrans':im_geotrans, \
-                'geosrs': espg_code, 'row': im_row, 'col': im_col,\
-                    'bands': im_bands}
 
     if im_bands > 1:
         img_array = np.transpose(img_array, (1, 2, 0)).astype(np.float64)  # 
@@ -38,32 +188,91 @@ def readTiff(path_in):
         return img_array, img_info
 
 ###  .tiff image write
-def writeTiff(im_data, im_geotrans, im_geosrs, path_out):
+def gdal_dtype(dtype):
+    ''' des: gdal data type of the numpy dtype (bool is written as byte). '''
+    dtype = np.dtype(np.uint8) if np.dtype(dtype) == bool else np.dtype(dtype)
+    datatype = gdal_array.NumericTypeCodeToGDALTypeCode(dtype)
+    if datatype is None:
+        raise ValueError('unsupported dtype for geotiff: %s' % dtype.name)
+    return datatype
+
+def tiff_options(dtype, tiled=False, block_size=256, compress=None, 
+                                    predictor=None, bigtiff='IF_SAFER', cog=False):
+    '''
+    des: creation options of the GTiff (or COG) driver.
+    args:
+        compress: None, 'DEFLATE', 'ZSTD', 'LZW', ...
+        predictor: None: auto (2 for integers, 3 for floats if compressed), 1: no predictor.
+        bigtiff: 'IF_SAFER', 'YES', 'NO'.
+    '''
+    options = ['BIGTIFF=%s' % bigtiff]
+    if cog:
+        options += ['BLOCKSIZE=%d' % block_size]
+    elif tiled:
+        options += ['TILED=YES', 'BLOCKXSIZE=%d' % block_size, 'BLOCKYSIZE=%d' % block_size]
+    if compress:
+        if predictor is None:
+            predictor = 3 if np.dtype(dtype).kind == 'f' else 2
+        if cog:   # the cog driver names the predictors
+            predictor = {1: 'NO', 2: 'STANDARD', 3: 'FLOATING_POINT'}[predictor]
+        options += ['COMPRESS=%s' % compress.upper(), 'PREDICTOR=%s' % predictor]
+    return options
+
+def writeTiff_blocks(blocks, im_shape, dtype, im_geotrans, im_geosrs, path_out, 
+                            tiled=False, block_size=256, compress=None, predictor=None, 
+                            bigtiff='IF_SAFER', cog=False, overviews=False, 
+                            resample='AVERAGE', nodata=None):
     '''
+    des: write the image block by block, the full image is not needed in memory.
     input:
-        im_data: tow dimentions (order: row, col),or three dimentions (order: row, col, band)
-        im_geosrs: espg code correspond to image spatial reference system.
+        blocks: iterator of (row_start, col_start, block), block: (row, col) or (row, col, band) array.
+        im_shape: (row, col) or (row, col, band) of the image.
+        tiled, block_size, compress, predictor, bigtiff: see tiff_options().
+        cog: if True, written as cloud-optimized geotiff (tiled, with internal overviews).
+        overviews: if True, internal overviews are built (always for cog).
+        resample: resampling method of the overviews.
+        nodata: nodata value of the bands.
     '''
-    if 'int8' in im_data.dtype.name:
-        datatype = gdal.GDT_Byte
-    elif 'int16' in im_data.dtype.name:
-        datatype = gdal.GDT_UInt16
-    else:
-        datatype = gdal.GDT_Float32
-    if len(im_data.shape) == 3:
-        im_data = np.transpose(im_data, (2, 0, 1))
-        im_bands, im_height, im_width = im_data.shape
-    else:
-        im_bands,(im_height, im_width) = 1,im_data.shape
+    im_height, im_width = im_shape[:2]
+    im_bands = im_shape[2] if len(im_shape) == 3 else 1
+    path_tiff = path_out + '.tmp.tif' if cog else path_out
+    options = tiff_options(dtype, tiled or cog, block_size, compress, predictor, bigtiff)
     driver = gdal.GetDriverByName("GTiff")
-    dataset = driver.Create(path_out, im_width, im_height, im_bands, datatype)
-    if(dataset!= None):
-        dataset.SetGeoTransform(im_geotrans)       # 
-        dataset.SetProjection("EPSG:" + str(im_geosrs))      # 
-    if im_bands > 1:
+    dataset = driver.Create(path_tiff, im_width, im_height, im_bands, gdal_dtype(dtype), options)
+    dataset.SetGeoTransform(im_geotrans)       # 
+    dataset.SetProjection("EPSG:" + str(im_geosrs))      # 
+    for row0, col0, block in blocks:
+        block = block.reshape(block.shape[:2] + (-1,))
+        for i in range(im_bands):
+            dataset.GetRasterBand(i+1).WriteArray(block[:, :, i], col0, row0)
+    if nodata is not None:
         for i in range(im_bands):
-            dataset.GetRasterBand(i+1).WriteArray(im_data[i])
+            dataset.GetRasterBand(i+1).SetNoDataValue(nodata)
+    if overviews and not cog:
+        factors, size = [], max(im_height, im_width)
+        while size // 2 ** (len(factors) + 1) >= block_size:
+            factors.append(2 ** (len(factors) + 1))
+        if factors:
+            dataset.BuildOverviews(resample, factors)
+    if cog:
+        options = tiff_options(dtype, True, block_size, compress, predictor, bigtiff, cog=True)
+        gdal.GetDriverByName("COG").CreateCopy(path_out, dataset, 
+                                options=options + ['OVERVIEWS=AUTO', 'RESAMPLING=%s' % resample])
         del dataset
+        gdal.GetDriverByName("GTiff").Delete(path_tiff)
     else:
-        dataset.GetRasterBand(1).WriteArray(im_data)
-        del dataset
\ No newline at end of file
+        del dataset
+
+def writeTiff(im_data, im_geotrans, im_geosrs, path_out, **options):
+    '''
+    input:
+        im_data: tow dimentions (order: row, col),or three dimentions (order: row, col, band)
+        im_geosrs: espg code correspond to image spatial reference system.
+        options: tiled, block_size, compress, predictor, bigtiff, cog, overviews, 
+                 resample, nodata, see writeTiff_blocks().
+    example:
+        writeTiff(dem, geotrans, 3031, 'dem.tif', tiled=True, compress='ZSTD')
+        writeTiff(img, geotrans, 32645, 'img_cog.tif', compress='DEFLATE', cog=True)
+    '''
+    writeTiff_blocks([(0, 0, im_data)], im_data.shape, im_data.dtype, 
+                            im_geotrans, im_geosrs, path_out, **options)
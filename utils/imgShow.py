@@ -3,33 +3,68 @@ import matplotlib.pyplot as plt
 import numpy as np
 
 
-def imgShow(img, extent=None, color_bands=(2,1,0), \
-                            clip_percent=2, per_band_clip='False', focus=None):
+def downsample(img, extent=None, color_bands=(2,1,0), focus=None, max_size=2048):
     '''
-    args:
-        img: (row, col, band) or (row, col), DN range should be in [0,1]
-        num_bands: a list/tuple, [red_band,green_band,blue_band]
-        clip_percent: for linear strech, value within the range of 0-100. 
-        per_band: if 'True', the band values will be clipped by each band respectively. 
-        focus: list, [up_start_percent,down_end_percent, left_start_percent, right_end_percent]
-                0 < value < 1
+    des: the (focused) image downsampled to the screen resolution (longer side within 
+         max_size) and its color bands, by strided view of the array, or by reading the 
+         overviews of the lazy raster (e.g., by geotif_io.readTiff(path, lazy=True)).
+    return:
+        img: (row, col, band) or (row, col) array, small copy of the image.
+        extent: extent of the returned image.
     '''
-    img = img.copy()
-    img[np.isnan(img)]=0
-    img = np.squeeze(img)
-    row,col,_ = img.shape
+    lazy = hasattr(img, 'read_overview')
+    if not lazy:
+        img = np.squeeze(img)
+    row, col = img.shape[:2]
+    row_start, row_end, col_start, col_end = 0, row, 0, col
     if focus:
-        # row_start, row_end, col_start, col_end = focus
         row_start_percent, row_end_percent, col_start_percent, col_end_percent = focus
         row_start, row_end = int(row*row_start_percent), int(row*row_end_percent)
         col_start, col_end = int(col*col_start_percent), int(col*col_end_percent)
-        img = img[row_start:row_end, col_start:col_end,:]
+    if lazy:
+        bands = [0] if img.shape[2] == 1 else list(color_bands)
+        img, img_info = img.read_overview(max_size, 
+                    (row_start, col_start, row_end-row_start, col_end-col_start), bands)
+        if extent is None:
+            return img, img_info['geoextent']
+    else:
+        step = max(-(-max(row_end-row_start, col_end-col_start) // max_size), 1)
+        img = img[row_start:row_end:step, col_start:col_end:step]
+        img = img[:,:,list(color_bands)] if len(img.shape) == 3 else img.copy()
+    if focus and extent is not None:
         x_extent, y_extent = extent[1]-extent[0], extent[3]-extent[2]
         extent_x_min = (col_start/col)*x_extent + extent[0]
         extent_x_max = (col_end/col)*x_extent + extent[0]
         extent_y_min = ((row-row_end)/row)*y_extent + extent[2]
         extent_y_max = ((row-row_start)/row)*y_extent + extent[2]
         extent = (extent_x_min, extent_x_max, extent_y_min, extent_y_max)
+    return img, extent
+
+def sample_percentile(img, q, n_sample=100000):
+    ''' des: percentiles estimated from the random sample (n_sample pixels) of the image. '''
+    values = img.ravel()
+    if values.size > n_sample:
+        values = values[np.random.default_rng(0).integers(0, values.size, n_sample)]
+    return np.percentile(values, q)
+
+def imgShow(img, extent=None, color_bands=(2,1,0), \
+                            clip_percent=2, per_band_clip='False', focus=None, 
+                            max_size=2048, n_sample=100000):
+    '''
+    args:
+        img: (row, col, band) or (row, col), DN range should be in [0,1]; 
+             or the lazy raster by geotif_io.readTiff(path, lazy=True).
+        num_bands: a list/tuple, [red_band,green_band,blue_band]
+        clip_percent: for linear strech, value within the range of 0-100. 
+        per_band: if 'True', the band values will be clipped by each band respectively. 
+        focus: list, [up_start_percent,down_end_percent, left_start_percent, right_end_percent]
+                0 < value < 1
+        max_size: the image is downsampled (longer side <= max_size) before display.
+        n_sample: number of the sampled pixels for the percentiles.
+    '''
+    img, extent = downsample(img, extent, color_bands, focus, max_size)
+    if img.dtype.kind == 'f':
+        img[np.isnan(img)]=0
     if np.min(img) == np.max(img):
         if len(img.shape) == 2:
             plt.imshow(np.clip(img, 0, 1), extent=extent, vmin=0,vmax=1)
@@ -39,21 +74,23 @@ def imgShow(img, extent=None, color_bands=(2,1,0), \
         if len(img.shape) == 2:
             img_color = np.expand_dims(img, axis=2)
         else:
-            img_color = img[:,:,[color_bands[0], color_bands[1], color_bands[2]]]    
-        img_color_clip = np.zeros_like(img_color)
+            img_color = img
+        img_color_clip = np.zeros(img_color.shape, dtype=np.float32)
         if per_band_clip == 'True':
             for i in range(img_color.shape[-1]):
                 if clip_percent == 0:
                     img_color_hist = [0,1]
                 else:
-                    img_color_hist = np.percentile(img_color[:,:,i], [clip_percent, 100-clip_percent])
+                    img_color_hist = sample_percentile(img_color[:,:,i], 
+                                            [clip_percent, 100-clip_percent], n_sample)
                 img_color_clip[:,:,i] = (img_color[:,:,i]-img_color_hist[0])\
                                     /(img_color_hist[1]-img_color_hist[0]+0.0001)
         else:
             if clip_percent == 0:
                     img_color_hist = [0,1]
             else:
-                img_color_hist = np.percentile(img_color, [clip_percent, 100-clip_percent])
+                img_color_hist = sample_percentile(img_color, 
+                                            [clip_percent, 100-clip_percent], n_sample)
             img_color_clip = (img_color-img_color_hist[0])\
                                      /(img_color_hist[1]-img_color_hist[0]+0.0001)
         plt.imshow(np.clip(img_color_clip, 0, 1), extent=extent, vmin=0, vmax=1)
@@ -0,0 +1,186 @@
+## author: xin luo
+## create: 2026.10.18
+## des: lake water level (per pass) from the atl13 points, the steps are same to
+##      the NamCo/Qinghailake notebooks: quality flag filtering -> latitude-band
+##      percentile filtering -> iqr+mad outlier removal -> robust level of each pass.
+##      all the grouped statistics are computed on the sorted points (no loop over groups).
+
+import numpy as np
+from utils.time_convert import dyr2dt64
+
+
+def quality_mask(qf_bckgrd, qf_bias_em, qf_bias_fit, stdev_water_surf,
+                    bckgrd_bad=(6, 127), bias_em_bad=(-3, 3, 4), bias_fit_bad=(-3, 3), stdev_max=2):
+    """
+    des: mask of the atl13 points with good quality flags.
+    args:
+        qf_bckgrd, qf_bias_em, qf_bias_fit, stdev_water_surf: atl13 variables.
+        bckgrd_bad, bias_em_bad, bias_fit_bad: the bad values of the flags.
+        stdev_max: max standard deviation of the water surface (m).
+    return:
+        keep: bool array, True for the good points.
+    """
+    return ~np.isin(qf_bckgrd, bckgrd_bad) & ~np.isin(qf_bias_em, bias_em_bad) & \
+                ~np.isin(qf_bias_fit, bias_fit_bad) & (stdev_water_surf <= stdev_max)
+
+
+def group_ids(*keys):
+    """
+    des: group id (0, 1, ..., n_group-1) of the points with same keys.
+    args:
+        keys: 1-d arrays with same length, e.g., rgt and day of the points.
+    return:
+        ids: group id of each point, the groups are ordered by the keys.
+        n_group: number of groups.
+    """
+    if len(keys[0]) == 0:
+        return np.zeros(0, dtype=np.int64), 0
+    isort = np.lexsort(keys[::-1])
+    head = np.zeros(len(isort), dtype=bool)
+    head[0] = True
+    for key in keys:
+        key_sorted = key[isort]
+        head[1:] |= key_sorted[1:] != key_sorted[:-1]
+    ids = np.empty(len(isort), dtype=np.int64)
+    ids[isort] = np.cumsum(head) - 1
+    return ids, int(head.sum())
+
+
+def grouped_quantile(values, ids, q, n_group=None):
+    """
+    des: quantiles of the values of each group, the linear interpolation
+         is same to pandas (.quantile()) and numpy (np.quantile()).
+    args:
+        values: 1-d array, without nan.
+        ids: group id (0, 1, ..., n_group-1) of the values, e.g., by group_ids().
+        q: float or list, quantiles in [0, 1].
+        n_group: number of groups, default is ids.max()+1.
+    return:
+        quantile: (n_group,) or (n_group, len(q)) array, nan for the empty group.
+    """
+    n_group = (ids.max() + 1 if len(ids) else 0) if n_group is None else n_group
+    q_ = np.atleast_1d(np.asarray(q, dtype=np.float64))
+    quantile = np.full((n_group, len(q_)), np.nan)
+    if len(values) > 0:
+        isort = np.lexsort((values, ids))
+        values_sorted = values[isort]
+        count = np.bincount(ids, minlength=n_group)
+        start = np.r_[0, np.cumsum(count)[:-1]]
+        valid, = np.where(count > 0)
+        pos = (count[valid, None] - 1) * q_[None, :]
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.minimum(lo + 1, count[valid, None] - 1)
+        v_lo = values_sorted[start[valid, None] + lo]
+        v_hi = values_sorted[start[valid, None] + hi]
+        quantile[valid] = v_lo + (v_hi - v_lo) * (pos - lo)
+    return quantile if np.ndim(q) else quantile[:, 0]
+
+
+def band_filter(h, lat, ids=None, interval=0.1, percentile=62):
+    """
+    des: latitude-band percentile filter, the points higher than
+         the percentile of the latitude band (of each group) are kept.
+    args:
+        h, lat: height and latitude of the points.
+        ids: group id of the points (e.g., pass), None: all the points are one group.
+        interval: interval of the latitude bands (degree).
+        percentile: percentile threshold (0-100).
+    return:
+        keep: bool array.
+    """
+    band = np.floor(lat / interval).astype(np.int64)
+    keys = (band,) if ids is None else (ids, band)
+    ids_band, n_band = group_ids(*keys)
+    threshold = grouped_quantile(h, ids_band, percentile / 100, n_band)
+    return h > threshold[ids_band]
+
+
+def iqr_mad_filter(h, ids, k_iqr=1.5, k_mad=3):
+    """
+    des: iqr and mad outlier removal within each group, the points within both
+         [q1-k_iqr*iqr, q3+k_iqr*iqr] and [median-k_mad*mad, median+k_mad*mad] are kept.
+    args:
+        h: height of the points.
+        ids: group id (0, 1, ..., n_group-1) of the points, e.g., pass.
+        k_iqr, k_mad: scale of the iqr and mad.
+    return:
+        keep: bool array.
+    """
+    n_group = ids.max() + 1 if len(ids) else 0
+    q1, median, q3 = grouped_quantile(h, ids, [0.25, 0.5, 0.75], n_group).T
+    mad = grouped_quantile(np.abs(h - median[ids]), ids, 0.5, n_group)
+    iqr = q3 - q1
+    lower = np.maximum(q1 - k_iqr * iqr, median - k_mad * mad)
+    upper = np.minimum(q3 + k_iqr * iqr, median + k_mad * mad)
+    return (h >= lower[ids]) & (h <= upper[ids])
+
+
+def pass_ids(t_dyr, rgt=None, lake=None):
+    """ des: pass id of the points, one pass is the points of the same rgt in the same day (utc)
+             (and of the same lake if given), the passes are ordered by (lake, day, rgt).
+    """
+    day = dyr2dt64(t_dyr, 's').astype('datetime64[D]').astype(np.int64)
+    keys = [key for key in (lake, day, rgt) if key is not None]
+    return group_ids(*keys)
+
+
+def pass_levels(t_dyr, h, ids, n_group=None):
+    """
+    des: robust water level of each pass.
+    args:
+        t_dyr, h: time (decimal year) and height of the points.
+        ids: pass id (0, 1, ..., n_group-1) of the points.
+    return:
+        levels: dict of (n_group,) arrays, t_dyr: mean time, h: median height,
+                h_std: mad-based std of the heights, h_se: standard error of the
+                level (1.2533*h_std/sqrt(npts)), npts: number of points.
+    """
+    n_group = (ids.max() + 1 if len(ids) else 0) if n_group is None else n_group
+    npts = np.bincount(ids, minlength=n_group)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t_mean = np.bincount(ids, weights=t_dyr, minlength=n_group) / npts
+        median = grouped_quantile(h, ids, 0.5, n_group)
+        h_std = 1.4826 * grouped_quantile(np.abs(h - median[ids]), ids, 0.5, n_group)
+        h_se = 1.2533 * h_std / np.sqrt(npts)      # standard error of the median
+    return {'t_dyr': t_mean, 'h': median, 'h_std': h_std, 'h_se': h_se, 'npts': npts}
+
+
+def lake_levels(t_dyr, h, lat, rgt=None, keep=None, band=None, k_iqr=1.5, k_mad=3, 
+                                                            min_pts=5, lake=None):
+    """
+    des: water levels (one for each pass) of a lake, or of multiple lakes if lake is given.
+    args:
+        t_dyr, h, lat: time (decimal year), height and latitude of the points.
+        rgt: reference ground track of the points, None: the passes are split only by day.
+        keep: bool array, the points to be used, e.g., by quality_mask().
+        band: [interval, percentile] for band_filter() within each pass, e.g., [0.1, 62]
+              (NamCo notebook), None: no band filtering.
+        k_iqr, k_mad: scale of the iqr and mad for the outlier removal within each pass.
+        min_pts: min number of the remained points of a pass.
+        lake: lake id of the points (e.g., by assign_polygons()), the passes are
+              split by lake, None: all the points are of one lake.
+    return:
+        levels: dict of arrays, see pass_levels(), 'rgt' and 'lake' are included if given.
+    """
+    valid = np.isfinite(t_dyr) & np.isfinite(h) & np.isfinite(lat)
+    if keep is not None:
+        valid &= keep
+    t_dyr, h, lat = t_dyr[valid], h[valid], lat[valid]
+    rgt = rgt[valid] if rgt is not None else None
+    lake = lake[valid] if lake is not None else None
+    ids, n_group = pass_ids(t_dyr, rgt, lake)
+    idx = np.arange(len(h))
+    ## 1. latitude-band filtering
+    if band is not None:
+        idx = idx[band_filter(h[idx], lat[idx], ids[idx], band[0], band[1])]
+    ## 2. iqr and mad outlier removal
+    idx = idx[iqr_mad_filter(h[idx], ids[idx], k_iqr, k_mad)]
+    ## 3. level of each pass
+    levels = pass_levels(t_dyr[idx], h[idx], ids[idx], n_group)
+    for name, key in [('rgt', rgt), ('lake', lake)]:
+        if key is not None:
+            key_pass = np.zeros(n_group, dtype=key.dtype)
+            key_pass[ids] = key
+            levels[name] = key_pass
+    select = levels['npts'] >= max(min_pts, 1)
+    return {key: value[select] for key, value in levels.items()}
@@ -1,10 +1,11 @@
 ## author: xin luo
-## create: 2021.9.19
-## des: griding-related functions.
+## create: 2021.9.19; modify: 2026.10.18
+## des: griding-related functions. the cell index of the points are computed
+##      directly by (x - xmin)/dx (no binned_statistic_2d), and the statistics of
+##      each cell are computed by bincount or on the points sorted by cell.
 
 
 import numpy as np
-from scipy import stats
 
 def make_grid(xmin, xmax, ymin, ymax, 
                         dx, dy, return_2d=True):
@@ -50,24 +51,148 @@ def get_grid_coor(xmin, xmax, ymin, ymax, dxy):
     return grids_coor
 
 
+def get_grid_edges(xmin, xmax, ymin, ymax, dxy, buff=0):
+    """
+    des: edges of the grid cells, same to get_grid_coor() (and the bins of get_grid_id()).
+    args:
+        xmin/xmax/ymin/ymax: boundaries of the grid.
+        dxy: grid-cell size, float or (dx, dy).
+        buff: buffer region, the edges are stretched to [xmin-buff, xmax+buff].
+    return:
+        xg, yg: edges in x and y, at least two edges (one cell) in each dimension.
+    """
+    dx, dy = (dxy, dxy) if np.ndim(dxy) == 0 else dxy
+    # zero-width range, widened same to scipy.stats.binned_statistic_2d
+    if xmin - buff == xmax + buff:
+        xmin, xmax = xmin - 0.5, xmax + 0.5
+    if ymin - buff == ymax + buff:
+        ymin, ymax = ymin - 0.5, ymax + 0.5
+    row = max(int(np.abs(ymax - ymin) / dy) + 1, 2)
+    col = max(int(np.abs(xmax - xmin) / dx) + 1, 2)
+    xg = np.linspace(xmin-buff, xmax+buff, col)
+    yg = np.linspace(ymin-buff, ymax+buff, row)
+    return xg, yg
+
+def get_edge_index(v, edges):
+    """
+    des: index of the points in the bins defined by increasing and evenly spaced edges,
+         same to np.digitize(v, edges): 0: v < edges[0], i: edges[i-1] <= v < edges[i], 
+         len(edges): v >= edges[-1] or nan. the points on the rightmost edge are 
+         in the last bin (same to scipy.stats.binned_statistic_2d).
+    """
+    v = np.asarray(v)
+    n_edge = len(edges)
+    width = (edges[-1] - edges[0]) / (n_edge - 1)
+    if not width > 0:    # zero-width bins: only the points on the edge are in the (last) bin
+        idx = np.where(v < edges[0], 0, n_edge)
+        idx[v == edges[-1]] = n_edge - 1
+        return idx.astype(np.int64)
+    with np.errstate(invalid='ignore'):
+        idx = np.floor((v - edges[0]) / width)
+        valid = np.isfinite(idx)
+        idx = np.where(valid, np.clip(idx, -1, n_edge - 1), n_edge - 1).astype(np.int64) + 1
+    # correct the index of the points near the edges (rounding of the division)
+    i_lo = np.clip(idx - 1, 0, n_edge - 1)
+    idx -= (idx > 0) & (v < edges[i_lo])
+    i_hi = np.clip(idx, 0, n_edge - 1)
+    idx += valid & (idx < n_edge) & (v >= edges[i_hi])
+    # the points on the rightmost edge
+    decimal = int(-np.log10(np.diff(edges).min())) + 6
+    on_edge = (idx == n_edge) & valid & (np.around(v, decimal) == np.around(edges[-1], decimal))
+    idx[on_edge] -= 1
+    return idx
+
+def get_cell_id(x, y, xg, yg):
+    """
+    des: cell id of the points (x,y), the id is same to the binnumber of 
+         scipy.stats.binned_statistic_2d(x, y, None, 'count', bins=[xg, yg]), i.e., 
+         ix*(len(yg)+1) + iy, ix/iy (1, ..., len(xg)-1) are the cell column/row, 
+         and ix/iy of 0 and len(xg)/len(yg) are the points out of the grid.
+    """
+    return get_edge_index(x, xg) * (len(yg) + 1) + get_edge_index(y, yg)
+
 def get_grid_id(x, y, xmin, xmax, ymin, ymax, dxy, buff):
     """
     des: get grid id for each given points (x,y).
     arg:
         x,y: coordinates of the photon points
         xmin/xmax/ymin/ymax: must be in grid projection: stereographic (m).
-        dxy: grid-cell size.
+        dxy: grid-cell size, float or (dx, dy).
         buff: buffer region, unit is same to x, y
     return:
-        the index of each points corresponding to the generated bins.  
+        the index of each points corresponding to the generated bins (see get_cell_id()).  
     """
-    # Number of tile edges on each dimension
-    row = int(np.abs(ymax - ymin) / dxy) + 1
-    col = int(np.abs(xmax - xmin) / dxy) + 1
-    # Coord of tile edges for each dimension
-    xg = np.linspace(xmin-buff, xmax+buff, col)
-    yg = np.linspace(ymin-buff, ymax+buff, row)
-    # Indicies for each points
-    grids_id = stats.binned_statistic_2d(x, y, np.ones(x.shape), 'count', bins=[xg, yg]).binnumber
-    return grids_id
+    xg, yg = get_grid_edges(xmin, xmax, ymin, ymax, dxy, buff)
+    return get_cell_id(x, y, xg, yg)
+
+def grid_stats(cell_id, z, n_cell, stats=('count', 'mean')):
+    """
+    des: statistics of the values within each cell. count/mean are computed by 
+         bincount, the others are computed on the values sorted by (cell, value).
+    args:
+        cell_id: cell id (0, ..., n_cell-1) of the values.
+        z: values, the nan values are ignored.
+        n_cell: number of cells.
+        stats: tuple of 'count', 'mean', 'std', 'min', 'max', 'median', 'mad'
+               (mad: median absolute deviation, scaled by 1.4826).
+    return:
+        dict, {stat: (n_cell,) array}, nan (count: 0) for the empty cells.
+    """
+    valid = ~np.isnan(z)
+    cell_id, z = cell_id[valid], z[valid]
+    out = {}
+    count = np.bincount(cell_id, minlength=n_cell)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(cell_id, weights=z, minlength=n_cell) / count
+        if 'count' in stats:
+            out['count'] = count
+        if 'mean' in stats:
+            out['mean'] = mean
+        if 'std' in stats:
+            dev = z - mean[cell_id]
+            out['std'] = np.sqrt(np.bincount(cell_id, weights=dev * dev, minlength=n_cell) / count)
+    if not set(stats) & {'min', 'max', 'median', 'mad'}:
+        return out
+    isort = np.lexsort((z, cell_id))
+    z_sorted = z[isort]
+    start = np.r_[0, np.cumsum(count)[:-1]]
+    cells, = np.where(count > 0)
+    def sorted_median(values_sorted):
+        i_lo = start[cells] + (count[cells] - 1) // 2
+        i_hi = start[cells] + count[cells] // 2
+        median = np.full(n_cell, np.nan)
+        median[cells] = 0.5 * (values_sorted[i_lo] + values_sorted[i_hi])
+        return median
+    for name, pos in [('min', start[cells]), ('max', start[cells] + count[cells] - 1)]:
+        if name in stats:
+            out[name] = np.full(n_cell, np.nan)
+            out[name][cells] = z_sorted[pos]
+    if 'median' in stats or 'mad' in stats:
+        median = sorted_median(z_sorted)
+        if 'median' in stats:
+            out['median'] = median
+        if 'mad' in stats:
+            cell_sorted = cell_id[isort]
+            dev = np.abs(z_sorted - median[cell_sorted])
+            dev_sorted = dev[np.lexsort((dev, cell_sorted))]
+            out['mad'] = 1.4826 * sorted_median(dev_sorted)
+    return out
 
+def binning_2d(x, y, z, xg, yg, stats=('count', 'mean')):
+    """
+    des: statistics of the values z within the grid cells.
+    args:
+        x, y, z: coordinates and values of the points.
+        xg, yg: edges of the grid, e.g., by get_grid_edges().
+        stats: see grid_stats().
+    return:
+        dict, {stat: (len(yg)-1, len(xg)-1) array}, the row i is the cells 
+              between yg[i] and yg[i+1] (same order to make_grid()).
+    """
+    ny, nx = len(yg) - 1, len(xg) - 1
+    ix = get_edge_index(x, xg) - 1
+    iy = get_edge_index(y, yg) - 1
+    inside = (ix >= 0) & (ix < nx) & (iy >= 0) & (iy < ny)
+    cell_id = iy[inside] * nx + ix[inside]
+    out = grid_stats(cell_id, np.asarray(z, dtype=np.float64)[inside], ny * nx, stats)
+    return {name: value.reshape(ny, nx) for name, value in out.items()}
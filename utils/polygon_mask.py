@@ -0,0 +1,103 @@
+## author: xin luo
+## create: 2026.10.18
+## des: vectorized point-in-polygon test, e.g., select the points within the lake polygons,
+##      and assign the points to the polygons (e.g., lakes of an inventory) by str-tree.
+
+import numpy as np
+
+
+def read_polygon(path_vector, epsg=4326):
+    """
+    des: read the polygons of a vector file (.gpkg/.shp/.geojson) as one prepared geometry.
+    args:
+        path_vector: path of the vector file.
+        epsg: the polygons are reprojected to the epsg if the crs of the file is defined.
+    return:
+        polygon: shapely geometry (union of the polygons), prepared.
+    """
+    import shapely
+    import geopandas as gpd
+    gdf = gpd.read_file(path_vector)
+    if gdf.crs is not None:
+        gdf = gdf.to_crs(epsg)
+    polygon = shapely.union_all(gdf.geometry.values)
+    shapely.prepare(polygon)
+    return polygon
+
+
+def points_in_polygon(x, y, polygon, chunk=1000000):
+    """
+    des: test whether the points are within the polygon. the points are first
+         selected by the bbox of the polygon, and then tested by the prepared
+         polygon (shapely.contains_xy) chunk by chunk.
+    args:
+        x, y: coordinates of the points, same coordinate system to the polygon.
+        polygon: shapely geometry.
+        chunk: number of points tested at a time.
+    return:
+        inside: bool array, True for the points within the polygon.
+    """
+    import shapely
+    shapely.prepare(polygon)
+    x, y = np.asarray(x), np.asarray(y)
+    xmin, ymin, xmax, ymax = polygon.bounds
+    idx, = np.where((x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax))   # bbox prefilter
+    inside = np.zeros(x.shape, dtype=bool)
+    for i in range(0, len(idx), chunk):
+        idx_chunk = idx[i:i+chunk]
+        inside[idx_chunk] = shapely.contains_xy(polygon, x[idx_chunk], y[idx_chunk])
+    return inside
+
+
+def read_polygons(path_vector, id_field=None, epsg=4326):
+    """
+    des: read the polygons of a vector file (.gpkg/.shp/.geojson) and their str-tree.
+    args:
+        path_vector: path of the vector file.
+        id_field: field of the polygon ids, None: the row numbers are the ids.
+        epsg: the polygons are reprojected to the epsg if the crs of the file is defined.
+    return:
+        tree: shapely.STRtree of the polygons.
+        ids: ids of the polygons, in the same order as the tree geometries.
+    """
+    import shapely
+    import geopandas as gpd
+    gdf = gpd.read_file(path_vector)
+    if gdf.crs is not None:
+        gdf = gdf.to_crs(epsg)
+    gdf = gdf[gdf.geometry.notna()]
+    ids = gdf[id_field].values if id_field else gdf.index.values
+    geoms = gdf.geometry.values
+    shapely.prepare(geoms)
+    return shapely.STRtree(geoms), np.asarray(ids)
+
+
+def assign_polygons(x, y, tree, chunk=1000000):
+    """
+    des: assign each point to the polygon containing it, the candidate polygons
+         are selected by the str-tree (bbox) and tested by the prepared polygons.
+         the point within multiple (overlapped) polygons is assigned to the first one.
+    args:
+        x, y: coordinates of the points, same coordinate system to the polygons.
+        tree: shapely.STRtree of the polygons, e.g., by read_polygons().
+        chunk: number of points tested at a time.
+    return:
+        ipoly: index (of the tree geometries) of the polygon of each point, -1: no polygon.
+    """
+    import shapely
+    x, y = np.asarray(x), np.asarray(y)
+    ipoly = np.full(x.shape, -1, dtype=np.int64)
+    geoms = tree.geometries
+    shapely.prepare(geoms)     # no-op for the prepared polygons (read_polygons())
+    for i in range(0, len(x), chunk):
+        x_chunk, y_chunk = x[i:i+chunk], y[i:i+chunk]
+        # candidate (point, polygon) pairs by the bbox, then tested by the prepared polygons
+        ipts, ipoly_pts = tree.query(shapely.points(x_chunk, y_chunk))
+        inside = shapely.contains_xy(geoms[ipoly_pts], x_chunk[ipts], y_chunk[ipts])
+        ipts, ipoly_pts = ipts[inside], ipoly_pts[inside]
+        # the first polygon of each point (the pairs are sorted by the point index)
+        ipoly_pts = ipoly_pts[np.lexsort((ipoly_pts, ipts))]
+        ipts = np.sort(ipts)
+        first = np.r_[True, ipts[1:] != ipts[:-1]] if len(ipts) else np.zeros(0, dtype=bool)
+        ipoly[i + ipts[first]] = ipoly_pts[first]
+    return ipoly
@@ -1,40 +1,93 @@
-# author: Fernando Paolo, 
-# modify: xin luo, 2021.8.15
+# author: Fernando Paolo,
+# modify: xin luo, 2021.8.15; 2026.10.18
 # des: filtering data within 2d space
 
 import numpy as np
-from scipy import stats
+from utils.make_grid import get_cell_id
 
-def spatial_filter(x, y, z, dx, dy, sigma=3.0):
+
+def outlier_sorted(z_sorted, bin_sorted, sigma=3.0):
     """
-    des: outlier filtering within the defined spatial region (dx * dy). 
+    des: outlier detection for grouped values. the values are sorted by
+         bin id and then by value (nan at the end of each bin),
+         so that each bin is a contiguous segment.
+    arg:
+        z_sorted: values sorted by (bin id, value)
+        bin_sorted: bin id of the sorted values
+        sigma: cut-off value
+    return:
+        outlier: bool array, True for the outlier of the sorted values.
+    """
+    if len(z_sorted) == 0:
+        return np.zeros(0, dtype=bool)
+    # start position of each bin (segment), and the segment id of each value
+    head = np.r_[True, bin_sorted[1:] != bin_sorted[:-1]]
+    start = np.flatnonzero(head)
+    seg = np.cumsum(head) - 1
+    valid = ~np.isnan(z_sorted)
+    z_fill = np.where(valid, z_sorted, 0.)
+    n_valid = np.add.reduceat(valid.astype(np.int64), start)
+    n_div = np.maximum(n_valid, 1)
+    # median: the valid values are sorted at the head of each segment
+    i_lo = start + np.maximum(n_valid - 1, 0) // 2
+    i_hi = start + n_valid // 2
+    i_hi = np.where(n_valid > 0, i_hi, i_lo)
+    z_med = 0.5 * (z_sorted[i_lo] + z_sorted[i_hi])
+    # standard deviation (ddof=0, same as np.nanstd)
+    z_mean = np.add.reduceat(z_fill, start) / n_div
+    z_dev = np.where(valid, z_sorted - z_mean[seg], 0.)
+    z_std = np.sqrt(np.add.reduceat(z_dev * z_dev, start) / n_div)
+    # nan values and the bins without valid value are never flagged
+    return np.abs(z_sorted - z_med[seg]) > sigma * z_std[seg]
+
+
+def spatial_filter(x, y, z, dx, dy, sigma=3.0, njobs=1):
+    """
+    des: outlier filtering within the defined spatial region (dx * dy).
+         the points are sorted by the bin id once, and the median/std
+         of each bin are computed over the contiguous segments.
     arg:
         x, y: coord_x and coord_y (m)
         z: value
         dx, dy: resolution in x (m) and y (m)
-        n_sigma: cut-off value
-        thres: max absolute value of data
-    return: 
+        sigma: cut-off value
+        njobs: number of processes, if > 1, the bins are splitted into
+               njobs ranges and filtered in parallel.
+    return:
         zo: filtered z, containing nan-values
     """
 
     Nn = int((np.abs(y.max() - y.min())) / dy) + 1
     Ne = int((np.abs(x.max() - x.min())) / dx) + 1
 
-    f_bin = stats.binned_statistic_2d(x, y, z, bins=(Ne, Nn))
-    index = f_bin.binnumber   # the bin index of each (x,y)
-    ind = np.unique(index)
+    xmin, xmax, ymin, ymax = x.min(), x.max(), y.min(), y.max()
+    # zero-width range (e.g., one point), widened same to scipy.stats.binned_statistic_2d
+    if xmin == xmax:
+        xmin, xmax = xmin - 0.5, xmax + 0.5
+    if ymin == ymax:
+        ymin, ymax = ymin - 0.5, ymax + 0.5
+    xg = np.linspace(xmin, xmax, Ne + 1)
+    yg = np.linspace(ymin, ymax, Nn + 1)
+    index = get_cell_id(x, y, xg, yg)   # the bin index of each (x,y)
+
+    # sort by bin id first and then by value.
+    isort = np.lexsort((z, index))
+    z_sorted, bin_sorted = z[isort], index[isort]
+
+    if njobs > 1:
+        from joblib import Parallel, delayed
+        # split the points at the bin boundaries (cell ranges)
+        start = np.flatnonzero(np.r_[True, bin_sorted[1:] != bin_sorted[:-1]])
+        cuts = [s[0] for s in np.array_split(start, njobs) if len(s) > 0]
+        cuts = cuts + [len(z_sorted)]
+        outlier = Parallel(n_jobs=njobs)(
+                    delayed(outlier_sorted)(z_sorted[i1:i2], bin_sorted[i1:i2], sigma)
+                                                    for i1, i2 in zip(cuts[:-1], cuts[1:]))
+        outlier = np.concatenate(outlier)
+    else:
+        outlier = outlier_sorted(z_sorted, bin_sorted, sigma)
+
     zo = z.copy()
-    # loop for each bin (valid data exit)
-    for i in range(len(ind)):
-        # index: bin index corresponding to each data point
-        idx, = np.where(index == ind[i])   # idx:  data points indices in specific bin
-        zb = z[idx]
-        if len(zb[~np.isnan(zb)]) == 0:
-            continue
-        dh = zb - np.nanmedian(zb)
-        foo = np.abs(dh) > sigma * np.nanstd(dh)
-        zb[foo] = np.nan
-        zo[idx] = zb
+    zo[isort[outlier]] = np.nan
 
     return zo
@@ -0,0 +1,115 @@
+## author: xin luo
+## create: 2026.10.18
+## des: time conversion (gps seconds, decimal year, datetime64) with numpy only.
+## note: 1. gps seconds start from 1980-01-06T00:00:00 (utc), gps time = tai - 19 s.
+##       2. the decimal year is computed in the tai scale, which is same as
+##          astropy: Time(Time(gps_seconds, format='gps'), format='decimalyear').value
+##       3. float64 decimal years resolve ~2.3e-13 yr (~7 us) at the current epoch,
+##          the gps seconds and datetime64 conversions are sub-microsecond.
+
+import numpy as np
+
+### tai time (naive datetime) of the gps epoch.
+TAI_EPOCH = np.datetime64('1980-01-06T00:00:19', 's')
+### utc time (naive datetime) of the gps epoch.
+GPS_EPOCH = np.datetime64('1980-01-06T00:00:00', 's')
+
+### leap seconds (utc) introduced after the gps epoch, each date increases gps-utc by 1 s.
+### source: IERS Bulletin C (https://hpiers.obspm.fr/iers/bul/bulc/Leap_Second.dat)
+LEAP_DATES = np.array(['1981-07-01', '1982-07-01', '1983-07-01', '1985-07-01',
+                       '1988-01-01', '1990-01-01', '1991-01-01', '1992-07-01',
+                       '1993-07-01', '1994-07-01', '1996-01-01', '1997-07-01',
+                       '1999-01-01', '2006-01-01', '2009-01-01', '2012-07-01',
+                       '2015-07-01', '2017-01-01'], dtype='datetime64[s]')
+### utc seconds (since gps epoch) and gps seconds of the leap seconds.
+LEAP_UTC = (LEAP_DATES - GPS_EPOCH).astype(np.float64)
+LEAP_GPS = LEAP_UTC + np.arange(1, len(LEAP_DATES) + 1)
+
+### gps seconds of the start of each year (tai scale), for the year-boundary lookups.
+YEARS = np.arange(1980, 2201)
+YEARS_GPS = ((YEARS - 1970).astype('datetime64[Y]').astype('datetime64[s]')
+                                                        - TAI_EPOCH).astype(np.float64)
+
+
+def gps2dyr(gps_seconds):
+    """ des: convert from gps seconds to decimal years.
+        args:
+            gps_seconds: seconds start with reference gps time.
+        return:
+            time_dyr: decimal years.
+    """
+    gps_seconds = np.asarray(gps_seconds, dtype=np.float64)
+    i_year = np.searchsorted(YEARS_GPS, gps_seconds, side='right') - 1
+    i_year = np.clip(i_year, 0, len(YEARS) - 2)
+    year_start, year_end = YEARS_GPS[i_year], YEARS_GPS[i_year + 1]
+    time_dyr = YEARS[i_year] + (gps_seconds - year_start) / (year_end - year_start)
+    return time_dyr
+
+
+def dyr2gps(time_dyr):
+    """ des: convert from decimal years to gps seconds.
+        args:
+            time_dyr: decimal years.
+        return:
+            gps_seconds: seconds start with reference gps time.
+    """
+    time_dyr = np.asarray(time_dyr, dtype=np.float64)
+    i_year = np.clip(np.floor(time_dyr).astype(np.int64) - YEARS[0], 0, len(YEARS) - 2)
+    year_start, year_end = YEARS_GPS[i_year], YEARS_GPS[i_year + 1]
+    return year_start + (time_dyr - YEARS[i_year]) * (year_end - year_start)
+
+
+def gps2utc(gps_seconds):
+    """ des: convert from gps seconds to utc seconds (since gps epoch, leap seconds removed).
+    """
+    gps_seconds = np.asarray(gps_seconds, dtype=np.float64)
+    return gps_seconds - np.searchsorted(LEAP_GPS, gps_seconds, side='right')
+
+
+def utc2gps(utc_seconds):
+    """ des: convert from utc seconds (since gps epoch) to gps seconds.
+    """
+    utc_seconds = np.asarray(utc_seconds, dtype=np.float64)
+    return utc_seconds + np.searchsorted(LEAP_UTC, utc_seconds, side='right')
+
+
+def gps2dt64(gps_seconds, unit='ns'):
+    """ des: convert from gps seconds to numpy datetime64 (utc).
+        args:
+            gps_seconds: seconds start with reference gps time.
+            unit: unit of the datetime64, e.g., 's', 'ms', 'us', 'ns'.
+        return:
+            datetime64 array (utc).
+    """
+    scale = np.timedelta64(1, 's') / np.timedelta64(1, unit)
+    utc_seconds = gps2utc(gps_seconds)
+    # integer and fractional seconds are converted separately to keep the precision.
+    sec = np.floor(utc_seconds)
+    frac = np.round((utc_seconds - sec) * scale)
+    return GPS_EPOCH.astype('datetime64[%s]' % unit) \
+                + sec.astype(np.int64).astype('timedelta64[s]') \
+                + frac.astype(np.int64).astype('timedelta64[%s]' % unit)
+
+
+def dt642gps(time_dt64):
+    """ des: convert from numpy datetime64 (utc) to gps seconds.
+        args:
+            time_dt64: datetime64 array (utc), or datetime strings.
+        return:
+            gps_seconds: seconds start with reference gps time.
+    """
+    time_dt64 = np.asarray(time_dt64, dtype='datetime64[ns]')
+    delta = time_dt64 - GPS_EPOCH.astype('datetime64[ns]')
+    sec = delta.astype('timedelta64[s]')
+    frac = (delta - sec).astype(np.int64) / 1e9
+    return utc2gps(sec.astype(np.float64) + frac)
+
+
+def dt642dyr(time_dt64):
+    """ des: convert from numpy datetime64 (utc) to decimal years. """
+    return gps2dyr(dt642gps(time_dt64))
+
+
+def dyr2dt64(time_dyr, unit='ns'):
+    """ des: convert from decimal years to numpy datetime64 (utc). """
+    return gps2dt64(dyr2gps(time_dyr), unit=unit)
@@ -1,20 +1,62 @@
-### ----- author: luo xin, creat: 2021.6.15, modify: 2021.6.23 -----
+### ----- author: luo xin, creat: 2021.6.15, modify: 2021.6.23; 2026.10.18 -----
 
 import pyproj
+import threading
 import numpy as np
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 
-def coor2coor(srs_from, srs_to, x, y):
+@lru_cache(maxsize=64)
+def _transformer(srs_from, srs_to, thread_id):
+    return pyproj.Transformer.from_crs(srs_from, srs_to, always_xy=True)
+
+def get_transformer(srs_from, srs_to):
+    """
+    des: the transformer from srs_from to srs_to (x/y order, i.e., lon/lat), the transformers 
+         are cached (lru) and reused. the transformer is not thread-safe, each thread has its own.
+    input:
+        srs_from and srs_to are EPSG number (e.g., 4326, 3031)
+    """
+    return _transformer(int(srs_from), int(srs_to), threading.get_ident())
+
+def coor2coor(srs_from, srs_to, x, y, out=None, chunk=1000000, njobs=1):
     """
     Transform coordinates from srs_from to srs_to
     input:
         srs_from and srs_to are EPSG number (e.g., 4326, 3031)
         x and y are x-coord and y-coord corresponding to srs_from and srs_to    
+        out: (x_out, y_out), float64 arrays (same shape to x) for the output, 
+             can be x and y themselves (in-place). None: new arrays.
+        chunk: number of points transformed at a time.
+        njobs: number of threads, the chunks are transformed in parallel (proj releases the gil).
     return:
         x-coord and y-coord in srs_to 
     """
-    srs_from = pyproj.Proj(int(srs_from))
-    srs_to = pyproj.Proj(int(srs_to))
-    return pyproj.transform(srs_from, srs_to, x, y, always_xy=True)
+    if np.ndim(x) == 0 and out is None:
+        return get_transformer(srs_from, srs_to).transform(x, y)
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    if out is None:
+        out = (np.empty(x.shape, dtype=np.float64), np.empty(y.shape, dtype=np.float64))
+    x_out, y_out = out
+    if not all(o.dtype == np.float64 and o.flags.c_contiguous and o.shape == x.shape for o in out):
+        raise ValueError('out should be c-contiguous float64 arrays with the shape of x')
+    x_flat, y_flat = x.reshape(-1), y.reshape(-1)
+    x_out_flat, y_out_flat = x_out.reshape(-1), y_out.reshape(-1)   # views of the output
+
+    def transform_chunk(i):
+        x_c, y_c = x_out_flat[i:i+chunk], y_out_flat[i:i+chunk]
+        if not np.shares_memory(x_c, x_flat):
+            x_c[:], y_c[:] = x_flat[i:i+chunk], y_flat[i:i+chunk]
+        get_transformer(srs_from, srs_to).transform(x_c, y_c, inplace=True)
+
+    starts = range(0, x_flat.size, chunk)
+    if njobs > 1 and len(starts) > 1:
+        with ThreadPoolExecutor(max_workers=njobs) as pool:
+            list(pool.map(transform_chunk, starts))
+    else:
+        for i in starts:
+            transform_chunk(i)
+    return x_out, y_out
 
 def geo2imagexy(x, y, gdal_trans):
     '''
@@ -1,19 +1,89 @@
 ## author: Fernando Paolo
-## modify: xin luo, 2022.10.7
+## modify: xin luo, 2022.10.7; 2026.10.18
 ## des: find and compute crossover values for the icesat2 data. 
 ## note: !!Due to icesat2 have 6 beams, this script is not suitable for another altimetry data.
 
+import os
 import numpy as np
-import pyproj
 import pandas as pd
 import warnings
-from scipy import stats
+from utils.transform_xy import coor2coor
+from utils.make_grid import get_grid_id
 # Ignore all warnings
 warnings.filterwarnings("ignore")
 
+def sweep_ranges(p_min, p_max, q_min, q_max, ax):
+    """
+    des: ranges of the candidate q-segments of each p-segment along the sweep axis. 
+         the q-segments are grouped by length (power-of-2 classes of the median length), 
+         and each group is swept with its own longest segment, so that a few long 
+         segments (e.g., at the data gaps) do not widen the sweep window of all segments.
+    input:
+        p_min, p_max: (N, 2) bbox of the p-segments.
+        q_min, q_max: (M, 2) bbox of the q-segments.
+        ax: the sweep axis (0: x, 1: y).
+    return:
+        list of (iq_sort, lo, hi) of the groups, the q-segments iq_sort[lo[i]:hi[i]]
+        are the candidates of the p-segment i.
+    """
+    q_len = q_max[:, ax] - q_min[:, ax]
+    len_ref = np.nanmedian(q_len) if np.any(q_len > 0) else 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        group = np.floor(np.log2(q_len / len_ref)) if len_ref > 0 else np.zeros(len(q_len))
+    group = np.clip(np.nan_to_num(group, nan=0, neginf=0), 0, None)
+    ranges = []
+    for g in np.unique(group):
+        iq_group, = np.where(group == g)
+        iq_sort = iq_group[np.argsort(q_min[iq_group, ax], kind='stable')]
+        q_start = q_min[iq_sort, ax]
+        len_max = np.nanmax(q_len[iq_group]) if np.any(np.isfinite(q_len[iq_group])) else 0
+        # q-segments starting within [p_min - len_max, p_max] along the axis may overlap p
+        lo = np.searchsorted(q_start, p_min[:, ax] - len_max, side='left')
+        hi = np.searchsorted(q_start, p_max[:, ax], side='right')
+        ranges.append((iq_sort, lo, hi))
+    return ranges
+
+
+def segment_candidates(p0, p1, q0, q1, max_pairs=1000000):
+    """
+    des: candidate segment pairs whose bounding boxes overlap, found by a sorted
+         sweep over the axis with the larger extent (no dense N x M matrix).
+    input:
+        p0, p1: (N, 2) start and end points of the segments of the first track.
+        q0, q1: (M, 2) start and end points of the segments of the second track.
+        max_pairs: max number of pairs expanded at once, to bound the memory.
+    yield:
+        ip, iq: index of the p-segments and q-segments of the candidate pairs, in chunks.
+    """
+    p_min, p_max = np.minimum(p0, p1), np.maximum(p0, p1)   # bbox of the segments
+    q_min, q_max = np.minimum(q0, q1), np.maximum(q0, q1)
+    if len(p_min) == 0 or len(q_min) == 0:
+        return
+    # sweep axis: the axis with the larger extent of the q-segments
+    ax = 0 if np.ptp(q_min[:, 0]) >= np.ptp(q_min[:, 1]) else 1
+    for iq_sort, lo, hi in sweep_ranges(p_min, p_max, q_min, q_max, ax):
+        num = hi - lo
+        ip_all, = np.where(num > 0)
+        if len(ip_all) == 0:
+            continue
+        # split the p-segments into blocks with bounded number of pairs
+        num_cum = np.cumsum(num[ip_all])
+        blocks = np.searchsorted(num_cum, np.arange(max_pairs, num_cum[-1], max_pairs), side='right')
+        for ip_blk in np.split(ip_all, blocks):
+            if len(ip_blk) == 0:
+                continue
+            num_blk = num[ip_blk]
+            ip = np.repeat(ip_blk, num_blk)
+            # position within each range: arange(num) for each p-segment
+            offset = np.arange(len(ip)) - np.repeat(np.cumsum(num_blk) - num_blk, num_blk)
+            iq = iq_sort[np.repeat(lo[ip_blk], num_blk) + offset]
+            # keep the pairs whose bboxs overlap in both axes
+            keep = np.all((p_min[ip] <= q_max[iq]) & (q_min[iq] <= p_max[ip]), axis=1)
+            yield ip[keep], iq[keep]
+
+
 def intersect(x_up, y_up, x_down, y_down):
     """
-    !!! more fast, but difficult to understand
     reference: 
         https://stackoverflow.com/questions/17928452/
         find-all-intersections-of-xy-data-point-graph-with-numpy
@@ -21,7 +91,9 @@ def intersect(x_up, y_up, x_down, y_down):
         p0 + s*(p1-p0) = q0 + t*(q1-q0); p and q are descending and ascending points respectively.
         ---> s*(p1-p0)-t*(q1-q0) = q0-p0
         if s and t belong to [0,1], p and q actually do intersect.
-        !! in order to speed up calculation, this code vectorizing solution of the 2x2 linear systems
+        !! in order to speed up calculation, the segments pairs are first selected by 
+           the overlap of their bounding boxes (sorted sweep, see segment_candidates), 
+           and the 2x2 linear systems are only solved (vectorized) for the candidate pairs.
     input:
         x_down, y_down: coord_x and coord_y of the descending points
         x_up, y_up: coord_x, coord_y of the ascending points.
@@ -32,21 +104,29 @@ def intersect(x_up, y_up, x_down, y_down):
     p = np.column_stack((x_down, y_down))   # coords of the descending points
     q = np.column_stack((x_up, y_up))       # coords of the ascending points
     (p0, p1, q0, q1) = p[:-1], p[1:], q[:-1], q[1:]   # remove first/last row respectively
-    # (num_uppoints, 2) - (num_dpoints, 1, 2), array broadcast, dim: (num_dpoints, num_uppoints, 2)
-    rhs = q0 - p0[:, np.newaxis, :]    
-    mat = np.empty((len(p0), len(q0), 2, 2))  # dim: (p_num, q_num, dif((x, y)), orbit(down,up))
-    mat[..., 0] = (p1 - p0)[:, np.newaxis]  # dif (x_down,y_down) between point_down and previous point_down
-    mat[..., 1] = q0 - q1      #  dif (x_up, y_up) between point_up and previous point_up
-    mat_inv = -mat.copy()
-    mat_inv[..., 0, 0] = mat[..., 1, 1]   # exchange between x_dif and y_dif, down and up
-    mat_inv[..., 1, 1] = mat[..., 0, 0]
-    det = mat[..., 0, 0] * mat[..., 1, 1] - mat[..., 0, 1] * mat[..., 1, 0]
-    mat_inv /= det[..., np.newaxis, np.newaxis]    # ???
-    params = mat_inv @ rhs[..., np.newaxis]        # 
-    intersection = np.all((params >= 0) & (params <= 1), axis=(-1, -2))  #
-    p0_s = params[intersection, 0, :] * mat[intersection, :, 0]
-    xover_coords = p0_s + p0[np.where(intersection)[0]]
-    idx_pre_down, idx_pre_up = np.where(intersection)[0], np.where(intersection)[1]
+    xover_coords, idx_pre_down, idx_pre_up = [], [], []
+    for ip, iq in segment_candidates(p0, p1, q0, q1):
+        rhs = q0[iq] - p0[ip]           # dim: (num_pairs, 2)
+        d_p = p1[ip] - p0[ip]           # dif (x_down,y_down) between point_down and previous point_down
+        d_q = q0[iq] - q1[iq]           # dif (x_up, y_up) between point_up and previous point_up
+        det = d_p[:, 0] * d_q[:, 1] - d_q[:, 0] * d_p[:, 1]
+        # inverse of the 2x2 matrix [[d_p_x, d_q_x], [d_p_y, d_q_y]]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            s = (d_q[:, 1] / det) * rhs[:, 0] + (-d_q[:, 0] / det) * rhs[:, 1]
+            t = (-d_p[:, 1] / det) * rhs[:, 0] + (d_p[:, 0] / det) * rhs[:, 1]
+        intersection = (s >= 0) & (s <= 1) & (t >= 0) & (t <= 1)
+        xover_coords.append(s[intersection, np.newaxis] * d_p[intersection] + p0[ip[intersection]])
+        idx_pre_down.append(ip[intersection])
+        idx_pre_up.append(iq[intersection])
+    if len(xover_coords) == 0:
+        xover_coords, idx_pre_down, idx_pre_up = np.empty((0, 2)), \
+                                    np.empty(0, dtype=int), np.empty(0, dtype=int)
+    else:
+        xover_coords, idx_pre_down, idx_pre_up = np.concatenate(xover_coords), \
+                                    np.concatenate(idx_pre_down), np.concatenate(idx_pre_up)
+    # same order as the dense solution: sorted by down index, then up index.
+    isort = np.lexsort((idx_pre_up, idx_pre_down))
+    xover_coords, idx_pre_down, idx_pre_up = xover_coords[isort], idx_pre_down[isort], idx_pre_up[isort]
     xover_x, xover_y = xover_coords[:,0], xover_coords[:,1]
     ## remove unreasonable xover points. avoid the crossover point located between 
     ## the one track end point and another track start point
@@ -92,27 +172,99 @@ def get_bboxs_id(x, y, xmin, xmax, ymin, ymax, dxy, buff):
     return:
         the index of each points corresponding to the generated bins.  
     """
-    dx, dy = dxy
-    # Number of tile edges on each dimension
-    Nns = int(np.abs(ymax - ymin) / dy) + 1
-    New = int(np.abs(xmax - xmin) / dx) + 1
-    # Coord of tile edges for each dimension
-    xg = np.linspace(xmin-buff, xmax+buff, New)
-    yg = np.linspace(ymin-buff, ymax+buff, Nns)
-    # Indicies for each points
-    bboxs_id = stats.binned_statistic_2d(x, y, np.ones(x.shape), 'count', bins=[xg, yg]).binnumber
-    return bboxs_id
+    return get_grid_id(x, y, xmin, xmax, ymin, ymax, dxy, buff)
 
-def coor2coor(srs_from, srs_to, x, y):
-    """ see utils/transform_xy
+def xover_spots(pts_as, pts_des, ispot_as, ispot_des):
     """
-    srs_from = pyproj.Proj(int(srs_from))
-    srs_to = pyproj.Proj(int(srs_to))
-    return pyproj.transform(srs_from, srs_to, x, y, always_xy=True)
+    des: crossovers between one ascending and one descending ground track (spot). 
+    arg:
+        pts_as, pts_des: (4, n) array, rows are x, y, t and h of the ascending/descending 
+                         points of the spots, in the original (along-track) order.
+        ispot_as, ispot_des: spot (groud track) of the ascending and descending points.
+    return:
+        out_i: (10, num_xover) array, or None if no crossover exists.
+    """
+    x_as_ispot, y_as_ispot, t_as_ispot, h_as_ispot = np.asarray(pts_as)
+    x_des_ispot, y_des_ispot, t_des_ispot, h_des_ispot = np.asarray(pts_des)
+    # Test length of vector
+    if len(x_as_ispot) < 3 or len(x_des_ispot) < 3: 
+        return None
+
+    # exact crossing points between two tracks of ascending/descending files.
+    xi, yi, idx_pre_as, idx_pre_des = intersect(x_as_ispot, y_as_ispot, x_des_ispot, y_des_ispot)
+    # ensure the xover points exit
+    if len(xi) == 0: return None
+    
+    ## time of the interpolation photon.
+    ti_as = interp_xover(x0=x_as_ispot[idx_pre_as], y0=y_as_ispot[idx_pre_as], z0=t_as_ispot[idx_pre_as], 
+                         x1=x_as_ispot[idx_pre_as+1], y1=y_as_ispot[idx_pre_as+1], z1=t_as_ispot[idx_pre_as+1], 
+                         xi=xi, yi=yi)
+    ti_des = interp_xover(x0=x_des_ispot[idx_pre_des], y0=y_des_ispot[idx_pre_des], z0=t_des_ispot[idx_pre_des], 
+                          x1=x_des_ispot[idx_pre_des+1], y1=y_des_ispot[idx_pre_des+1], z1=t_des_ispot[idx_pre_des+1], 
+                          xi=xi, yi=yi)
+
+    ## height of the interpolation photon.
+    hi_as = interp_xover(x0=x_as_ispot[idx_pre_as], y0=y_as_ispot[idx_pre_as], \
+                    z0=h_as_ispot[idx_pre_as], x1=x_as_ispot[idx_pre_as+1], \
+                    y1=y_as_ispot[idx_pre_as+1], z1=h_as_ispot[idx_pre_as+1], xi=xi, yi=yi)
+    hi_des = interp_xover(x0=x_des_ispot[idx_pre_des], y0=y_des_ispot[idx_pre_des], \
+                    z0=h_des_ispot[idx_pre_des], x1=x_des_ispot[idx_pre_des+1], \
+                    y1=y_des_ispot[idx_pre_des+1], z1=h_des_ispot[idx_pre_des+1], xi=xi, yi=yi)
+
+    # Create output array
+    out_i = np.full((10, len(xi)), np.nan)
+    # Compute differences and save parameters
+    out_i[0]  = xi              # crossover points coord_x
+    out_i[1]  = yi              # ... coord_y
+    out_i[2]  = hi_as           # interpolated height by ascending track
+    out_i[3]  = hi_des          # interpolated height by descending track
+    out_i[4]  = ti_as           # interpolated time by ascending track
+    out_i[5]  = ti_des           # interpolated time by descending track
+    out_i[6] = ispot_as      # groud track of ascending file
+    out_i[7] = ispot_des     # groud track of decending file
+    out_i[8]  = hi_as - hi_des    ## height difference between ascending and descending interpolations
+    out_i[9]  = ti_as - ti_des    ## time difference between ...        
+    return out_i
+
+
+def xover_tasks(pts_as, pts_des, tasks):
+    """
+    des: run a batch of crossover tasks (tile x spot pair).
+    arg:
+        pts_as, pts_des: (4, n) arrays (x, y, t, h) of the ascending/descending points sorted by
+                         (tile, spot), or path of the .npy files (opened as read-only memmap).
+        tasks: list of (ispot_as, i1_as, i2_as, ispot_des, i1_des, i2_des), the points of 
+               a task are the contiguous slices pts[:, i1:i2].
+    return:
+        list of the out_i (or None) of each task, in the order of the tasks.
+    """
+    if isinstance(pts_as, str):
+        pts_as = np.load(pts_as, mmap_mode='r')
+        pts_des = np.load(pts_des, mmap_mode='r')
+    return [xover_spots(pts_as[:, a1:a2], pts_des[:, d1:d2], spot_a, spot_d) 
+                            for spot_a, a1, a2, spot_d, d1, d2 in tasks]
+
+
+def group_slices(*keys):
+    """
+    des: start/end of the groups of keys-sorted array.
+    arg:
+        keys: sorted key arrays, e.g., tile id and spot.
+    return:
+        starts, ends: start and end index of each group.
+    """
+    head = np.zeros(len(keys[0]), dtype=bool)
+    head[:1] = True
+    for key in keys:
+        head[1:] |= key[1:] != key[:-1]
+    starts = np.flatnonzero(head)
+    ends = np.r_[starts[1:], len(head)]
+    return starts, ends
+
 
 def xover_icesat2(lon_as, lat_as, t_as, h_as, spot_as, 
             lon_des, lat_des, t_des, h_des, spot_des, 
-            proj, tile_dxy=[20, 20], buff=2):
+            proj, tile_dxy=[20, 20], buff=2, njobs=1, xy_as=None, xy_des=None):
     """ 
     des: find and compute crossover values. 
     arg:
@@ -127,18 +279,22 @@ def xover_icesat2(lon_as, lat_as, t_as, h_as, spot_as,
         proj: projection (espg number).
         tile_dxy: width/height of the generated tile. For speeding up processing. unit:km
         buff: buffer of the tile. unit: km
+        njobs: number of processes, the tile x spot pair tasks are distributed to a process pool, 
+               the points are shared with the workers through read-only memmap files.
+               also the number of threads for the coordinate transformation.
+        xy_as, xy_des: (x, y), projected coordinates (epsg: proj) of the ascending/descending
+               points, e.g., stored in the readout file (add_xy.py). None: from lon/lat.
     return:
         out: 
     """
     if proj == "4326":
         raise ValueError("proj can't be 4326")
-    tile_dxy[0] *= 1e3
-    tile_dxy[1] *= 1e3
-    buff *= 1e3
+    tile_dxy = [tile_dxy[0] * 1e3, tile_dxy[1] * 1e3]
+    buff = buff * 1e3
     ######## -------- 1. find the xover points -------- #####
     # Transform to wanted coordinate system
-    (x_as, y_as) = coor2coor(4326, proj, lon_as, lat_as)
-    (x_des, y_des) = coor2coor(4326, proj, lon_des, lat_des)
+    (x_as, y_as) = coor2coor(4326, proj, lon_as, lat_as, njobs=njobs) if xy_as is None else xy_as
+    (x_des, y_des) = coor2coor(4326, proj, lon_des, lat_des, njobs=njobs) if xy_des is None else xy_des
 
     # spatial range (m)
     xmin = max(np.nanmin(x_as), np.nanmin(x_des))
@@ -151,109 +307,61 @@ def xover_icesat2(lon_as, lat_as, t_as, h_as, spot_as,
     # here the bin is tile.
     id_bboxs_as = get_bboxs_id(x_as, y_as, xmin, xmax, ymin, ymax, tile_dxy, buff)     # box id of the ascending photon
     id_bboxs_des = get_bboxs_id(x_des, y_des, xmin, xmax, ymin, ymax, tile_dxy, buff)  # box id of the descending photon
-    # Copy box for convenience
-    id_bboxs = id_bboxs_as
-    # Initiate output container (dictionary)
-    out = []    
-    ibox = np.unique(id_bboxs)
+
+    # sort the points by (tile, spot), the along-track order is kept (stable sort),
+    # so that the points of each tile x spot are a contiguous slice. 
+    isort_as = np.lexsort((spot_as, id_bboxs_as))
+    isort_des = np.lexsort((spot_des, id_bboxs_des))
+    pts_as = np.vstack([x_as, y_as, t_as, h_as])[:, isort_as]
+    pts_des = np.vstack([x_des, y_des, t_des, h_des])[:, isort_des]
+    box_as, spot_as_sort = id_bboxs_as[isort_as], spot_as[isort_as]
+    box_des, spot_des_sort = id_bboxs_des[isort_des], spot_des[isort_des]
+    starts_as, ends_as = group_slices(box_as, spot_as_sort)
+    starts_des, ends_des = group_slices(box_des, spot_des_sort)
+
+    ibox = np.unique(id_bboxs_as)
     print('searching ibox (sub-tile):', ibox)    
-    num_box = 0              #  counter: count of the bins valid
 
-    print('computing crossovers ...')
     #######   for bin in bins:
     #######       for track_as in tracks_as:    ## track is beam of the icesat2.
     #######           for track_des in tracks_des: 
     #######               find the xover_points.
-    # loop through each unique bin (tile)
-    # k is the unique bin index.
-    for k in ibox:   
-        ibox_as, = np.where(id_bboxs_as == k)    # ibox_as is the box index of data points 
-        ibox_des, = np.where(id_bboxs_des == k)
-        # Extract points in the bin
-        # ascending orbit
-        spot_as_ibox = spot_as[ibox_as]
-        x_as_ibox = x_as[ibox_as]
-        y_as_ibox = y_as[ibox_as]
-        h_as_ibox = h_as[ibox_as]
-        t_as_ibox = t_as[ibox_as]
-        # descending orbit        
-        spot_des_ibox = spot_des[ibox_des]   
-        x_des_ibox = x_des[ibox_des]
-        y_des_ibox = y_des[ibox_des]
-        h_des_ibox = h_des[ibox_des]
-        t_des_ibox = t_des[ibox_des]
-
-        # get unique tracks
-        spot_as_ibox_unique = np.unique(spot_as_ibox)
-        spot_des_ibox_unique = np.unique(spot_des_ibox)
-
-        # Test if tile has no data 
-        # cause bboxs = bboxs1, len(orbits1) !=1, len(orbits2) could be 0.
-        if len(spot_as_ibox) == 0 or len(spot_des_ibox) == 0:
-            continue
-
-        # ---- loop through tracks (ground track in the specific bin) 
-        # --> ascending tracks
-        for ispot_as_ibox in spot_as_ibox_unique:
-            ## i_trk_: point index of the specific groud track.
-            i_as_spot = spot_as_ibox == ispot_as_ibox 
-            ## extract points from the specific orbit (a specific track)
-            x_as_ispot = x_as_ibox[i_as_spot]
-            y_as_ispot = y_as_ibox[i_as_spot]
-            t_as_ispot = t_as_ibox[i_as_spot]
-            h_as_ispot = h_as_ibox[i_as_spot]
-            
-            # Loop through groud tracks (1-6) in specific bin 
-            # --> descending tracks
-            for ispot_des_ibox in spot_des_ibox_unique:
-                # index of data points of specific track in file 2
-                i_des_spot = spot_des_ibox == ispot_des_ibox
-                # extract points from a specific orbit (groud track)
-                x_des_ispot = x_des_ibox[i_des_spot]
-                y_des_ispot = y_des_ibox[i_des_spot]
-                t_des_ispot = t_des_ibox[i_des_spot]
-                h_des_ispot = h_des_ibox[i_des_spot]                
-                # Test length of vector
-                if len(x_as_ispot) < 3 or len(x_des_ispot) < 3: 
-                    continue
-
-                # exact crossing points between two tracks of ascending/descending files.
-                xi, yi, idx_pre_as, idx_pre_des = intersect(x_as_ispot, y_as_ispot, x_des_ispot, y_des_ispot)
-                # ensure the xover points exit
-                if len(xi) == 0: continue
-                
-                ## time of the interpolation photon.
-                ti_as = interp_xover(x0=x_as_ispot[idx_pre_as], y0=y_as_ispot[idx_pre_as], z0=t_as_ispot[idx_pre_as], 
-                                     x1=x_as_ispot[idx_pre_as+1], y1=y_as_ispot[idx_pre_as+1], z1=t_as_ispot[idx_pre_as+1], 
-                                     xi=xi, yi=yi)
-                ti_des = interp_xover(x0=x_des_ispot[idx_pre_des], y0=y_des_ispot[idx_pre_des], z0=t_des_ispot[idx_pre_des], 
-                                      x1=x_des_ispot[idx_pre_des+1], y1=y_des_ispot[idx_pre_des+1], z1=t_des_ispot[idx_pre_des+1], 
-                                      xi=xi, yi=yi)
+    # generate the tasks: (tile, ascending spot, descending spot)
+    tasks = []
+    i_des = 0
+    for i1_as, i2_as in zip(starts_as, ends_as):
+        k = box_as[i1_as]
+        # descending spots in the same tile (k), both are sorted by tile.
+        while i_des < len(starts_des) and box_des[starts_des[i_des]] < k:
+            i_des += 1
+        j = i_des
+        while j < len(starts_des) and box_des[starts_des[j]] == k:
+            tasks.append((spot_as_sort[i1_as], i1_as, i2_as, 
+                            spot_des_sort[starts_des[j]], starts_des[j], ends_des[j]))
+            j += 1
+    print('computing crossovers ...')
 
-                ## height of the interpolation photon.
-                hi_as = interp_xover(x0=x_as_ispot[idx_pre_as], y0=y_as_ispot[idx_pre_as], \
-                                z0=h_as_ispot[idx_pre_as], x1=x_as_ispot[idx_pre_as+1], \
-                                y1=y_as_ispot[idx_pre_as+1], z1=h_as_ispot[idx_pre_as+1], xi=xi, yi=yi)
-                hi_des = interp_xover(x0=x_des_ispot[idx_pre_des], y0=y_des_ispot[idx_pre_des], \
-                                z0=h_des_ispot[idx_pre_des], x1=x_des_ispot[idx_pre_des+1], \
-                                y1=y_des_ispot[idx_pre_des+1], z1=h_des_ispot[idx_pre_des+1], xi=xi, yi=yi)
+    if njobs > 1 and len(tasks) > 1:
+        import shutil, tempfile
+        from joblib import Parallel, delayed
+        # share the points with the workers through memmap files rather than pickling.
+        dir_tmp = tempfile.mkdtemp(prefix='xover_')
+        try:
+            file_as, file_des = os.path.join(dir_tmp, 'pts_as.npy'), os.path.join(dir_tmp, 'pts_des.npy')
+            np.save(file_as, pts_as)
+            np.save(file_des, pts_des)
+            batches = [list(b) for b in np.array_split(np.arange(len(tasks)), 
+                                                        min(len(tasks), njobs*4)) if len(b) > 0]
+            outs = Parallel(n_jobs=njobs)(delayed(xover_tasks)(file_as, file_des, 
+                                            [tasks[i] for i in batch]) for batch in batches)
+        finally:
+            shutil.rmtree(dir_tmp, ignore_errors=True)
+        out = [out_i for outs_batch in outs for out_i in outs_batch]   # keep the order of tasks
+    else:
+        out = xover_tasks(pts_as, pts_des, tasks)
+    # Initiate output container (list)
+    out = [out_i for out_i in out if out_i is not None]
 
-                # Create output array
-                out_i = np.full((10, len(xi)), np.nan)
-                # Compute differences and save parameters
-                out_i[0]  = xi              # crossover points coord_x
-                out_i[1]  = yi              # ... coord_y
-                out_i[2]  = hi_as           # interpolated height by ascending track
-                out_i[3]  = hi_des          # interpolated height by descending track
-                out_i[4]  = ti_as           # interpolated time by ascending track
-                out_i[5]  = ti_des           # interpolated time by descending track
-                out_i[6] = ispot_as_ibox      # groud track of ascending file
-                out_i[7] = ispot_des_ibox     # groud track of decending file
-                out_i[8]  = hi_as - hi_des    ## height difference between ascending and descending interpolations
-                out_i[9]  = ti_as - ti_des    ## time difference between ...        
-                # Add to list
-                out.append(out_i)
-        num_box += 1
     # Change back to numpy array
     # Test if output container is empty 
     if len(out) == 0:
@@ -275,4 +383,3 @@ def xover_icesat2(lon_as, lat_as, t_as, h_as, spot_as,
     out_df = pd.DataFrame(out, columns=['o_lon', 'o_lat', 'oh_as', 'oh_des', 'ot_as', 'ot_des', \
                                     'ospot_as', 'ospot_des', 'oh_dif', 'ot_dif'])
     return out_df
-
@@ -0,0 +1,101 @@
+## author: xin luo
+## create: 2026.10.18
+## des: add the projected coordinates (x/y) to the readout files, the epsg number is
+##      saved in the 'epsg' attribute of x/y. the downstream tools (split_tiles.py,
+##      xover_catalog.py) reuse the x/y of the same epsg instead of reprojecting lon/lat.
+
+'''
+example:
+    python add_xy.py ./readout/*_readout.h5 -p 3031 -n 4
+    python add_xy.py ./readout/*_readout.h5 -p 3413 -c lon lat
+'''
+
+import os
+import sys
+import h5py
+import argparse
+from glob import glob
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.transform_xy import coor2coor
+
+XY_NAMES = ['x', 'y']
+
+def get_args():
+    """ Get command-line arguments. """
+    parser = argparse.ArgumentParser(
+            description='add projected coordinates (x/y) to the readout files')
+    parser.add_argument(
+            'ifiles', metavar='ifiles', type=str, nargs='+',
+            help='readout files (HDF5)')
+    parser.add_argument(
+            '-p', metavar=('epsg_num'), dest='proj', type=str, nargs=1,
+            help=('EPSG proj number (AnIS=3031, GrIS=3413)'),
+            default=['3031'],)
+    parser.add_argument(
+            '-c', metavar=('lon','lat'), dest='coord_name', type=str, nargs=2,
+            help=('name of lon/lat variables'),
+            default=['lon', 'lat'])
+    parser.add_argument(
+            '-n', metavar=('njobs'), dest='njobs', type=int, nargs=1,
+            help="number of threads for the coordinate transformation",
+            default=[1],)
+    return parser.parse_args()
+
+
+def write_xy(f_out, lon, lat, proj, njobs=1):
+    """
+    des: write the projected coordinates of lon/lat to the opened h5 file,
+         the existing x/y are replaced.
+    arg:
+        f_out: h5py.File opened in 'w'/'r+' mode.
+        lon, lat: wgs84 coordinates of the points.
+        proj: epsg number of the projection.
+    """
+    x, y = coor2coor(4326, proj, lon, lat, njobs=njobs)
+    for name, value in zip(XY_NAMES, (x, y)):
+        if name in f_out:
+            del f_out[name]
+        f_out.create_dataset(name, data=value)
+        f_out[name].attrs['epsg'] = int(proj)
+
+
+def has_xy(fi, proj):
+    """ des: True if the x/y of the given epsg are in the opened h5 file. """
+    return all(name in fi and fi[name].attrs.get('epsg', None) == int(proj) for name in XY_NAMES)
+
+
+def read_xy(fi, proj, coord_name=['lon', 'lat'], njobs=1):
+    """
+    des: projected coordinates of the points in the opened h5 file, the stored x/y
+         are read if their epsg is same to proj, otherwise lon/lat are reprojected.
+    return:
+        x, y: projected coordinates.
+    """
+    if has_xy(fi, proj):
+        return fi[XY_NAMES[0]][:], fi[XY_NAMES[1]][:]
+    lon_name, lat_name = coord_name
+    return coor2coor(4326, proj, fi[lon_name][:], fi[lat_name][:], njobs=njobs)
+
+
+def add_xy(ifile, proj='3031', coord_name=['lon', 'lat'], njobs=1):
+    """ des: add x/y of the given epsg to the readout file (skipped if exist). """
+    lon_name, lat_name = coord_name
+    with h5py.File(ifile, 'r+') as f:
+        if has_xy(f, proj):
+            return
+        write_xy(f, f[lon_name][:], f[lat_name][:], proj, njobs)
+    print('written x/y (epsg:%s):' % proj, ifile)
+
+
+if __name__ == '__main__':
+
+    args = get_args()
+    ifiles = args.ifiles[:]
+    proj = args.proj[0]
+    coord_name = args.coord_name[:]
+    njobs = args.njobs[0]
+
+    if len(ifiles) == 1:
+        ifiles = glob(ifiles[0])
+    for ifile in sorted(ifiles):
+        add_xy(ifile, proj, coord_name, njobs)
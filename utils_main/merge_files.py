@@ -1,21 +1,25 @@
 # author: Fernando Paolo;
-# modify: xin luo, 2021.8.10.  
+# modify: xin luo, 2021.8.10; 2026.10.18.
 
 """
 des: merges several HDF5 files into a single file or multiple larger files.
 example
     merge_files.py path/to/ifiles_*.h5 -o path/to/ofile.h5
     merge_files.py path/to/ifiles_*.h5 -o path/to/ofile.h5 -m 5 -n 5
+    merge_files.py path/to/ifiles_*.h5 -o path/to/ofile.h5 -z gzip
+    merge_files.py path/to/ifiles_*.h5 -o path/to/ofile_vds.h5 --virtual
+    merge_files.py path/to/ifiles_*.h5 -o path/to/ofile.h5 -cat path/to/catalog.db
 notes
     - The parallel option (-n) only works for multiple outputs (-m)!
     - If no 'key' is given, it merges files in the order they are passed/read.
     - If receive "Argument list too long", pass a string.
     - See complementary program: split.py
+    - Data are copied in chunks (CHUNK_COPY rows), the memory does not grow with the total size.
+    - With --virtual, no data is copied: the output maps onto the input files (absolute paths), 
+      which must be kept; -z is ignored.
 """
 
 import warnings
-
-from numpy.core.fromnumeric import compress
 warnings.filterwarnings("ignore")
 import os
 import h5py
@@ -23,7 +27,11 @@ import argparse
 import numpy as np
 from glob import glob
 from joblib import Parallel, delayed
+from readout_catalog import select_files
 
+# number of rows copied at a time, and number of rows of each chunk of the output dataset.
+CHUNK_COPY = 1000000
+CHUNK_ROWS = 100000
 
 def get_args():
     """ Pass command-line arguments. """
@@ -56,6 +64,14 @@ def get_args():
             '-n', metavar='njobs', dest='njobs', type=int, nargs=1,
             help=('number of jobs for parallel processing when using -m'),
             default=[1],)
+    parser.add_argument(
+            '--virtual', dest='virtual', action='store_true',
+            help=('write a virtual dataset (VDS) file mapping the variables onto the input files, '
+                  'no data is copied'),)
+    parser.add_argument(
+            '-cat', metavar='catalog', dest='catalog', type=str, nargs=1,
+            help=('footprint catalog (sqlite, by readout_catalog.py), the files without points are skipped'),
+            default=[None],)
     return parser.parse_args()
 
 
@@ -66,11 +82,20 @@ def get_total_len(ifiles):
         return:
             N: length of the Dataset. 
     """
-    N = 0
+    return sum(get_lens(ifiles))
+
+def get_lens(ifiles):
+    """ des: Get output length of each input file. 
+        arg:
+            ifiles: preprocessed h5 file, consist of only Dataset.
+        return:
+            lens: list, length of the Dataset of each file. 
+    """
+    lens = []
     for fn in ifiles:
-        with h5py.File(fn) as f:
-            N += list(f.values())[0].shape[0]
-    return N
+        with h5py.File(fn, 'r') as f:
+            lens.append(list(f.values())[0].shape[0])
+    return lens
 
 def get_var_names(ifile):
     """ des: return all '/variable' names in the HDF5. 
@@ -119,11 +144,23 @@ def sort_files(ifiles, key=None):
         ifiles.sort(key=natkey)
 
 
-def merge(ifiles, ofile, vnames, comp):
-    ''' des: merge the similar files into one file
+def get_chunks(N, shape_tail, rows=CHUNK_ROWS):
+    """ des: chunk shape of the output dataset (None for the empty dataset). """
+    if N == 0:
+        return None
+    return (min(N, rows),) + tuple(shape_tail)
+
+
+def merge(ifiles, ofile, vnames, comp, chunk=CHUNK_COPY):
+    ''' des: merge the similar files into one file. 
+             the output datasets are preallocated and each input is copied in 
+             fixed-size chunks at the running offsets, so that the memory is bounded.
     arg:
         ifiles: list with strs, files need to be merged.
         ofile: str, the name of the merged file.     
+        vnames: list, the variables to be merged.
+        comp: compression of the merged file, None, 'lzf' or 'gzip'.
+        chunk: number of rows copied at a time.
     retrun:
         none
     '''
@@ -131,34 +168,69 @@ def merge(ifiles, ofile, vnames, comp):
     print('Calculating lenght of output from all input files ...')
     N = get_total_len(ifiles)   # 
 
-    data_dict = {key: [] for key in vnames}
-    for ifile in ifiles:
-        print(('reading', ifile))
-        with h5py.File(ifile, 'r') as f2:
-            for key in vnames:
-                data_dict[key].append(f2[key][:])
-
-# 将所有数据合并成一个数组
-    for key in vnames:
-        data_dict[key] = np.concatenate(data_dict[key], axis=0)
-
-# 创建输出文件并写入数据
     with h5py.File(ofile, 'w') as out_f:
+        # preallocate the output datasets (dtype and shape are from the first file)
         with h5py.File(ifiles[0], 'r') as in_f_0:
             for key in vnames:
-                shape_var = in_f_0[key][:].shape
-                if len(shape_var) == 1:
-                    out_f.create_dataset(key, (data_dict[key].shape[0],), dtype=None, compression=comp)
-                else:
-                    out_f.create_dataset(key, (data_dict[key].shape[0], shape_var[1]), dtype=None, compression=comp)
-
-            # 写入合并的数据
-                out_f[key][:] = data_dict[key]
+                dset = in_f_0[key]
+                out_f.create_dataset(key, (N,) + dset.shape[1:], dtype=dset.dtype, 
+                                     chunks=get_chunks(N, dset.shape[1:]), compression=comp, 
+                                     shuffle=comp is not None and N > 0)
+                out_f[key].attrs.update(dset.attrs)
+        # copy the input data chunk by chunk
+        i0 = 0
+        for ifile in ifiles:
+            print(('reading', ifile))
+            with h5py.File(ifile, 'r') as f2:
+                n = list(f2.values())[0].shape[0]
+                for key in vnames:
+                    dset_in, dset_out = f2[key], out_f[key]
+                    buf = np.empty((min(n, chunk),) + dset_in.shape[1:], dtype=dset_out.dtype)
+                    for j in range(0, n, chunk):
+                        k = min(j + chunk, n)
+                        dset_in.read_direct(buf, source_sel=np.s_[j:k], dest_sel=np.s_[0:k-j])
+                        dset_out.write_direct(buf, source_sel=np.s_[0:k-j], dest_sel=np.s_[i0+j:i0+k])
+            i0 += n
 
     print(('merged', len(ifiles), 'files'))
     print(('output ->', ofile))
 
 
+def merge_virtual(ifiles, ofile, vnames):
+    ''' des: merge the similar files into one virtual dataset (VDS) file, the variables of 
+             the output file are mapped onto the input files (no data is copied). 
+             the output can be read as a normal h5 file, but the input files should be kept 
+             (in the same absolute paths).
+    arg:
+        ifiles: list with strs, files need to be merged.
+        ofile: str, the name of the merged (virtual) file.     
+        vnames: list, the variables to be merged.
+    retrun:
+        none
+    '''
+    lens = get_lens(ifiles)
+    N = sum(lens)
+    with h5py.File(ifiles[0], 'r') as in_f_0:
+        layouts = {key: h5py.VirtualLayout(shape=(N,) + in_f_0[key].shape[1:], 
+                                        dtype=in_f_0[key].dtype) for key in vnames}
+        attrs = {key: dict(in_f_0[key].attrs) for key in vnames}
+    i0 = 0
+    for ifile, n in zip(ifiles, lens):
+        if n == 0:
+            continue
+        path = os.path.abspath(ifile)
+        for key in vnames:
+            shape = (n,) + layouts[key].shape[1:]
+            layouts[key][i0:i0+n] = h5py.VirtualSource(path, key, shape=shape)
+        i0 += n
+    with h5py.File(ofile, 'w', libver='latest') as out_f:
+        for key in vnames:
+            out_f.create_virtual_dataset(key, layouts[key])
+            out_f[key].attrs.update(attrs[key])
+
+    print(('merged (virtual)', len(ifiles), 'files'))
+    print(('output ->', ofile))
+
 
 if __name__ == '__main__':
 
@@ -170,12 +242,16 @@ if __name__ == '__main__':
     comp = args.comp[0]
     key = args.key[0]
     njobs = args.njobs[0]
+    virtual = args.virtual
+    catalog = args.catalog[0]
 
     if os.path.exists(ofile): 
         os.remove(ofile)
     # In case a string is passed to avoid "argument list too long"
     if len(ifile) == 1:
         ifile = glob(ifile[0])
+    if catalog:
+        ifile = select_files(catalog, ifile)
     if not ifile:
         print("Error:No input files found.")
         exit(1)
@@ -196,7 +272,11 @@ if __name__ == '__main__':
     else:
         ifile, ofile = [ifile], [ofile]
 
-    if njobs > 1 and nfiles > 1:
+    if virtual:
+        print('Writing virtual dataset ...')
+        for fi,fo in zip (ifile,ofile):
+            merge_virtual(fi,fo,vnames)
+    elif njobs > 1 and nfiles > 1:
         print(('Running parallel code (%d jobs) ...' % njobs))
         Parallel(n_jobs=njobs, verbose=5)(
                 delayed(merge)(fi, fo, vnames, comp) for fi, fo in zip(ifile,ofile))
@@ -0,0 +1,316 @@
+## author: xin luo
+## create: 2026.10.18
+## des: streaming gridding of the points (e.g., atl06 heights) of the readout files into
+##      a geotiff raster (bands: mean, std, count, and median if required).
+
+'''
+des: the points are read chunk by chunk, and accumulated into the per-cell
+     count, sum and sum of squares (and min/max), so that the memory depends on
+     the grid size rather than the number of points.
+     median (-m): approx: the per-cell histogram (-b bins) of the 2nd pass, the median
+                  is interpolated within the median bin.
+                  exact: the values within the median bins are collected by a 3rd pass.
+example:
+    python points_to_grid.py ./readout/*_readout.h5 -o ./dem.tif -r -1600000 -1400000 -400000 -200000 -d 500 -p 3031
+    python points_to_grid.py ./readout/*_readout.h5 -o ./dem_2020.tif -d 500 -p 3031 -t 2020 2021 -m exact
+'''
+
+import os
+import sys
+import h5py
+import argparse
+import numpy as np
+from glob import glob
+from add_xy import has_xy
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.transform_xy import coor2coor
+from utils.make_grid import get_edge_index, grid_stats
+from utils.geotif_io import writeTiff
+
+CHUNK_ROWS = 1000000
+
+def get_args():
+    """ Get command-line arguments. """
+    parser = argparse.ArgumentParser(
+            description='grid the points of the readout files into geotiff')
+    parser.add_argument(
+            'ifiles', metavar='ifiles', type=str, nargs='+',
+            help='readout files (HDF5)')
+    parser.add_argument(
+            '-o', metavar='ofile', dest='ofile', type=str, nargs=1,
+            help='output geotiff file',
+            required=True)
+    parser.add_argument(
+            '-r', metavar=('xmin', 'xmax', 'ymin', 'ymax'), dest='extent', type=float, nargs=4,
+            help=('extent of the grid (m), None: the extent of the points'),
+            default=[None, None, None, None])
+    parser.add_argument(
+            '-d', metavar=('dx', 'dy'), dest='dxy', type=float, nargs='+',
+            help=('resolution of the grid (m)'),
+            required=True)
+    parser.add_argument(
+            '-p', metavar=('epsg_num'), dest='proj', type=str, nargs=1,
+            help=('EPSG proj number (AnIS=3031, GrIS=3413)'),
+            default=['3031'],)
+    parser.add_argument(
+            '-c', metavar=('lon','lat'), dest='coord_name', type=str, nargs=2,
+            help=('name of lon/lat variables'),
+            default=['lon', 'lat'])
+    parser.add_argument(
+            '-z', metavar=('z_name'), dest='z_name', type=str, nargs=1,
+            help=('name of the gridded variable'),
+            default=['h'])
+    parser.add_argument(
+            '-t', metavar=('time_range'), dest='time_range', type=float, nargs=2,
+            help=('only the points within the time range are gridded'),
+            default=[None, None])
+    parser.add_argument(
+            '-tn', metavar=('time_name'), dest='time_name', type=str, nargs=1,
+            help=('name of time variables'),
+            default=['t_dyr'])
+    parser.add_argument(
+            '-m', metavar=('median'), dest='median', type=str, nargs=1,
+            help=('median band: None, approx or exact'),
+            choices=['approx', 'exact'], default=[None])
+    parser.add_argument(
+            '-b', metavar=('nbins'), dest='nbins', type=int, nargs=1,
+            help=('number of the histogram bins of each cell for the median'),
+            default=[32])
+    return parser.parse_args()
+
+
+def iter_chunks(ifiles, proj='3031', coord_name=['lon', 'lat'], z_name='h',
+                    time_range=[None, None], time_name='t_dyr', chunk=CHUNK_ROWS):
+    """
+    des: read the points of the files chunk by chunk, the stored x/y (same epsg)
+         are used, otherwise lon/lat are reprojected.
+    return:
+        generator of (x, y, z) arrays.
+    """
+    lon_name, lat_name = coord_name
+    for ifile in ifiles:
+        with h5py.File(ifile, 'r') as fi:
+            stored_xy = has_xy(fi, proj)
+            n = fi[z_name].shape[0]
+            for i in range(0, n, chunk):
+                sel = np.s_[i:min(i + chunk, n)]
+                z = fi[z_name][sel].astype(np.float64)
+                if stored_xy:
+                    x, y = fi['x'][sel], fi['y'][sel]
+                else:
+                    x, y = coor2coor(4326, proj, fi[lon_name][sel], fi[lat_name][sel])
+                if time_range[0] is not None:
+                    t = fi[time_name][sel]
+                    keep = (t >= time_range[0]) & (t <= time_range[1])
+                    x, y, z = x[keep], y[keep], z[keep]
+                yield x, y, z
+
+
+def get_raster_grid(extent, dx, dy):
+    """
+    des: raster grid (north up) covering the extent.
+    return:
+        xg, yg: increasing cell edges in x and y.
+        geotrans: gdal geotransform of the raster.
+    """
+    xmin, xmax, ymin, ymax = extent
+    ncol = max(int(np.ceil((xmax - xmin) / dx)), 1)
+    nrow = max(int(np.ceil((ymax - ymin) / dy)), 1)
+    xg = xmin + dx * np.arange(ncol + 1)
+    yg = ymax - dy * np.arange(nrow + 1)[::-1]
+    geotrans = (xmin, dx, 0, ymax, 0, -dy)
+    return xg, yg, geotrans
+
+
+def cell_index(x, y, z, xg, yg):
+    """
+    des: raster cell index (row*ncol + col, row 0 is the top) of the points.
+    return:
+        idx: cell index of the valid points (in the grid, z is not nan).
+        z: values of the valid points.
+    """
+    ncol, nrow = len(xg) - 1, len(yg) - 1
+    col = get_edge_index(x, xg) - 1
+    row = nrow - get_edge_index(y, yg)
+    valid = (col >= 0) & (col < ncol) & (row >= 0) & (row < nrow) & ~np.isnan(z)
+    return row[valid] * ncol + col[valid], z[valid]
+
+
+def accumulate(chunks, xg, yg):
+    """
+    des: 1st pass, per-cell count, sum, sum of squares, min and max. the sums are
+         computed relative to the first value (z_ref), for the numerical stability.
+    return:
+        acc: dict of (nrow*ncol,) arrays, and z_ref.
+    """
+    n_cell = (len(xg) - 1) * (len(yg) - 1)
+    acc = {'count': np.zeros(n_cell, dtype=np.int64), 'sum': np.zeros(n_cell),
+           'sum2': np.zeros(n_cell), 'min': np.full(n_cell, np.nan), 'max': np.full(n_cell, np.nan)}
+    z_ref = None
+    for x, y, z in chunks:
+        idx, z = cell_index(x, y, z, xg, yg)
+        if len(z) == 0:
+            continue
+        z_ref = z[0] if z_ref is None else z_ref
+        cells, inv = np.unique(idx, return_inverse=True)   # cells touched by the chunk
+        dz = z - z_ref
+        acc['count'][cells] += np.bincount(inv, minlength=len(cells))
+        acc['sum'][cells] += np.bincount(inv, weights=dz, minlength=len(cells))
+        acc['sum2'][cells] += np.bincount(inv, weights=dz * dz, minlength=len(cells))
+        stats = grid_stats(inv, z, len(cells), ('min', 'max'))
+        acc['min'][cells] = np.fmin(acc['min'][cells], stats['min'])
+        acc['max'][cells] = np.fmax(acc['max'][cells], stats['max'])
+    acc['z_ref'] = 0. if z_ref is None else z_ref
+    return acc
+
+
+def hist_bin(idx, z, acc, nbins):
+    """ des: histogram bin (0, ..., nbins-1) of the values within their cells (min-max range). """
+    zmin, zmax = acc['min'][idx], acc['max'][idx]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        b = np.floor((z - zmin) / (zmax - zmin) * nbins)
+    return np.clip(np.nan_to_num(b), 0, nbins - 1).astype(np.int64)
+
+
+def histogram(chunks, xg, yg, acc, nbins=32):
+    """ des: 2nd pass, per-cell histogram (nrow*ncol, nbins) of the values. """
+    n_cell = (len(xg) - 1) * (len(yg) - 1)
+    hist = np.zeros((n_cell, nbins), dtype=np.int32)
+    for x, y, z in chunks:
+        idx, z = cell_index(x, y, z, xg, yg)
+        keys, counts = np.unique(idx * nbins + hist_bin(idx, z, acc, nbins), return_counts=True)
+        hist.reshape(-1)[keys] += counts.astype(np.int32)
+    return hist
+
+
+def median_bins(hist, rank):
+    """ des: the histogram bin of the value of given rank (0-based) of each cell,
+             and the number of values before the bin. """
+    cum = np.cumsum(hist, axis=1)
+    b = np.argmax(cum > rank[:, None], axis=1)
+    before = np.take_along_axis(cum, b[:, None], axis=1)[:, 0] - hist[np.arange(len(b)), b]
+    return b, before
+
+
+def median_approx(acc, hist):
+    """ des: approximate median, interpolated within the median bin of the histogram. """
+    nbins = hist.shape[1]
+    count = acc['count']
+    rank = (count - 1) / 2.
+    b, before = median_bins(hist, np.floor(rank).astype(np.int64))
+    n_bin = hist[np.arange(len(b)), b]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        frac = (rank - before + 0.5) / n_bin
+        median = acc['min'] + (b + np.clip(frac, 0, 1)) * (acc['max'] - acc['min']) / nbins
+    median[count == 0] = np.nan
+    median[acc['min'] == acc['max']] = acc['min'][acc['min'] == acc['max']]
+    return median
+
+
+def median_exact(chunks, xg, yg, acc, hist):
+    """ des: 3rd pass, exact median, the values within the median bins
+             (of rank (n-1)//2 and n//2) are collected and sorted. """
+    nbins = hist.shape[1]
+    count = acc['count']
+    ranks = [(count - 1) // 2, count // 2]
+    bins = [median_bins(hist, np.maximum(rank, 0)) for rank in ranks]
+    cells, bs, zs = [], [], []
+    for x, y, z in chunks:
+        idx, z = cell_index(x, y, z, xg, yg)
+        b = hist_bin(idx, z, acc, nbins)
+        keep = (b == bins[0][0][idx]) | (b == bins[1][0][idx])
+        cells.append(idx[keep]); bs.append(b[keep]); zs.append(z[keep])
+    cells, bs, zs = np.concatenate(cells), np.concatenate(bs), np.concatenate(zs)
+    isort = np.lexsort((zs, bs, cells))
+    cells, bs, zs = cells[isort], bs[isort], zs[isort]
+    # position of each value within its (cell, bin) group
+    head = np.r_[True, (cells[1:] != cells[:-1]) | (bs[1:] != bs[:-1])]
+    start = np.flatnonzero(head)
+    pos = np.arange(len(zs)) - start[np.cumsum(head) - 1]
+    median = np.zeros(len(count))
+    for rank, (b, before) in zip(ranks, bins):
+        pick = (bs == b[cells]) & (pos == rank[cells] - before[cells])
+        median[cells[pick]] += 0.5 * zs[pick]
+    median[count == 0] = np.nan
+    return median
+
+
+def points_to_grid(ifiles, ofile, extent, dxy, proj='3031', coord_name=['lon', 'lat'],
+                        z_name='h', time_range=[None, None], time_name='t_dyr',
+                        median=None, nbins=32):
+    """
+    des: grid the points of the readout files into geotiff, the bands are
+         mean, std, count, and median (if median is 'approx' or 'exact').
+    arg:
+        ifiles: readout files.
+        ofile: output geotiff file.
+        extent: [xmin, xmax, ymin, ymax] of the grid (m).
+        dxy: [dx, dy], resolution of the grid (m).
+        proj: epsg number of the grid.
+        z_name: the gridded variable.
+        time_range, time_name: only the points within the time range are gridded.
+        median: None, 'approx' or 'exact'.
+        nbins: number of the histogram bins of each cell for the median.
+    """
+    dx, dy = dxy
+    xg, yg, geotrans = get_raster_grid(extent, dx, dy)
+    nrow, ncol = len(yg) - 1, len(xg) - 1
+    chunks = lambda: iter_chunks(ifiles, proj, coord_name, z_name, time_range, time_name)
+    print('grid size (row, col):', nrow, ncol)
+    print('pass 1: accumulating count/sum/sum of squares ...')
+    acc = accumulate(chunks(), xg, yg)
+    count = acc['count']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_d = acc['sum'] / count
+        std = np.sqrt(np.maximum(acc['sum2'] / count - mean_d * mean_d, 0))
+    bands = [mean_d + acc['z_ref'], std, count.astype(np.float64)]
+    if median is not None:
+        print('pass 2: histogram of each cell ...')
+        hist = histogram(chunks(), xg, yg, acc, nbins)
+        if median == 'exact':
+            print('pass 3: exact median ...')
+            bands.append(median_exact(chunks(), xg, yg, acc, hist))
+        else:
+            bands.append(median_approx(acc, hist))
+        del hist
+    img = np.stack([band.reshape(nrow, ncol) for band in bands], axis=-1).astype(np.float32)
+    writeTiff(img, geotrans, proj, ofile, tiled=True, compress='DEFLATE', nodata=np.nan)
+    print('number of points:', count.sum(), ', cells with points:', (count > 0).sum())
+    print('output ->', ofile, '(bands: mean, std, count%s)' % (', median' if median else ''))
+
+
+def get_extent(ifiles, proj='3031', coord_name=['lon', 'lat']):
+    """ des: extent [xmin, xmax, ymin, ymax] of the points of the files. """
+    extent = [np.inf, -np.inf, np.inf, -np.inf]
+    for x, y, z in iter_chunks(ifiles, proj, coord_name, coord_name[0]):
+        if len(x) == 0:
+            continue
+        extent = [min(extent[0], np.nanmin(x)), max(extent[1], np.nanmax(x)),
+                  min(extent[2], np.nanmin(y)), max(extent[3], np.nanmax(y))]
+    return extent
+
+
+if __name__ == '__main__':
+
+    args = get_args()
+    ifiles = args.ifiles[:]
+    ofile = args.ofile[0]
+    extent = args.extent[:]
+    dxy = args.dxy * 2 if len(args.dxy) == 1 else args.dxy[:2]
+    proj = args.proj[0]
+    coord_name = args.coord_name[:]
+    z_name = args.z_name[0]
+    time_range = args.time_range
+    time_name = args.time_name[0]
+    median = args.median[0]
+    nbins = args.nbins[0]
+
+    if len(ifiles) == 1:
+        ifiles = glob(ifiles[0])
+    ifiles = sorted(ifiles)
+    if extent[0] is None:
+        extent = get_extent(ifiles, proj, coord_name)
+        print('extent of the points:', extent)
+
+    points_to_grid(ifiles, ofile, extent, dxy, proj, coord_name, z_name,
+                            time_range, time_name, median, nbins)
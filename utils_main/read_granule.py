@@ -0,0 +1,454 @@
+# author: xin luo
+# create: 2026.10.18
+# des: read in and write out reorganized icesat2 granules (atl03/atl06/atl08/atl13),
+#      the variables are described by a per-product schema.
+
+'''
+des: 1. read and split icesat2 granules by beams, only the requested variables are read.
+     2. select valid (high quality) points if the product defines a filter (atl06).
+     3. add the orbit type to the output data.
+example:
+    python read_granule.py ./input/path/*ATL13*.h5 -p atl13 -o /output/path/dir -n 4
+    python read_granule.py ./input/path/*ATL13*.h5 -p atl13 -v h lon lat t_dyr -o /output/path/dir
+    python read_granule.py ./input/path/*ATL08*.h5 -p atl08 -o /output/path/dir
+    python read_granule.py ./input/path/*ATL13*.h5 -p atl13 -b 90.2 91.0 30.4 30.9 -o /output/path/dir
+    python read_granule.py ./input/path/*ATL13*.h5 -p atl13 -g ./namco.gpkg -o /output/path/dir
+    python read_granule.py ./input/path/*ATL06*.h5 -p atl06 -e 3031 -o /output/path/dir
+'''
+
+import os
+import sys
+import h5py
+import numpy as np
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.time_convert import gps2dyr, gps2dt64
+from utils.polygon_mask import read_polygon, points_in_polygon
+from add_xy import write_xy
+
+
+## schema of the products:
+##   beam_group: group of the beam variables, relative to the beam (e.g., gt1l).
+##   lon, lat, time: beam variables of longitude, latitude and time (seconds since atlas 
+##              sdp epoch), used by the region selection and the derived variables.
+##   filter: (beam variable, valid value), only the valid points are kept.
+##   vars: output variable -> (source, path, dtype)
+##         source: 'beam': beam variable; 'granule': granule variable broadcasted to the points;
+##                 'derived': computed from the time/latitude/beam attributes.
+##   keys: default output variables.
+PRODUCTS = {
+    'atl03': {
+        'beam_group': 'heights', 'lon': 'lon_ph', 'lat': 'lat_ph', 'time': 'delta_time', 'filter': None,
+        'vars': {
+            'lon': ('beam', 'lon_ph', 'f8'),
+            'lat': ('beam', 'lat_ph', 'f8'),
+            'h': ('beam', 'h_ph', 'f8'),
+            'signal_conf_ph': ('beam', 'signal_conf_ph', 'i1'),
+            'quality_ph': ('beam', 'quality_ph', 'i1'),
+            'cycle': ('granule', '/orbit_info/cycle_number', 'f8'),
+            'rgt': ('granule', '/orbit_info/rgt', 'f8'),
+            },
+        'keys': ['lon', 'lat', 'h', 't_dyr', 'cycle', 'rgt', 'beam_type',
+                                'spot', 'orbit_type', 'signal_conf_ph'],
+        },
+    'atl06': {
+        'beam_group': 'land_ice_segments', 'lon': 'longitude', 'lat': 'latitude', 
+        'time': 'delta_time',
+        'filter': ('atl06_quality_summary', 0),
+        'vars': {
+            'lon': ('beam', 'longitude', 'f8'),
+            'lat': ('beam', 'latitude', 'f8'),
+            'h': ('beam', 'h_li', 'f8'),
+            'h_sigma': ('beam', 'h_li_sigma', 'f8'),
+            'cycle': ('granule', '/orbit_info/cycle_number', 'f8'),
+            'rgt': ('granule', '/orbit_info/rgt', 'f8'),
+            },
+        'keys': ['lon', 'lat', 'h', 't_dyr', 'cycle', 'rgt',
+                        'beam_type', 'spot', 'orbit_type', 'formatted_time'],
+        },
+    'atl08': {
+        'beam_group': 'land_segments', 'lon': 'longitude', 'lat': 'latitude', 
+        'time': 'delta_time', 'filter': None,
+        'vars': {
+            'lon': ('beam', 'longitude', 'f8'),
+            'lat': ('beam', 'latitude', 'f8'),
+            'h': ('beam', 'terrain/h_te_best_fit', 'f8'),
+            'h_te_uncertainty': ('beam', 'terrain/h_te_uncertainty', 'f8'),
+            'h_canopy': ('beam', 'canopy/h_canopy', 'f8'),
+            'h_canopy_uncertainty': ('beam', 'canopy/h_canopy_uncertainty', 'f8'),
+            'segment_landcover': ('beam', 'segment_landcover', 'f8'),
+            'night_flag': ('beam', 'night_flag', 'f8'),
+            'msw_flag': ('beam', 'msw_flag', 'f8'),
+            'cycle': ('granule', '/orbit_info/cycle_number', 'f8'),
+            'rgt': ('granule', '/orbit_info/rgt', 'f8'),
+            },
+        'keys': ['lon', 'lat', 'h', 'h_canopy', 't_dyr', 'cycle', 'rgt',
+                                    'beam_type', 'spot', 'orbit_type'],
+        },
+    'atl13': {
+        'beam_group': '', 'lon': 'sseg_mean_lon', 'lat': 'sseg_mean_lat', 
+        'time': 'sseg_mean_time', 'filter': None,
+        'vars': {
+            'h': ('beam', 'ht_ortho', 'f8'),
+            'lon': ('beam', 'sseg_mean_lon', 'f8'),
+            'lat': ('beam', 'sseg_mean_lat', 'f8'),
+            'rgt': ('beam', 'rgt', 'f8'),
+            'qf_bckgrd': ('beam', 'qf_bckgrd', 'f8'),
+            'qf_bias_em': ('beam', 'qf_bias_em', 'f8'),
+            'qf_bias_fit': ('beam', 'qf_bias_fit', 'f8'),
+            'stdev_water_surf': ('beam', 'stdev_water_surf', 'f8'),
+            'water_depth': ('beam', 'water_depth', 'f8'),
+            },
+        'keys': ['h', 'lon', 'lat', 't_dyr', 'beam_type', 'rgt', 'spot', 'orbit_type',
+                        'qf_bckgrd', 'qf_bias_em', 'qf_bias_fit', 'stdev_water_surf'],
+        },
+    }
+
+## variables derived by the reader, available for all products.
+DERIVED = {
+    't_dyr': ('derived', None, 'f8'),            # time in decimal years
+    'orbit_type': ('derived', None, 'f8'),       # 1: ascending, 0: descending
+    'beam_type': ('derived', None, 'f8'),        # 1: strong, 0: weak
+    'spot': ('derived', None, 'f8'),             # spot number (1-6)
+    'formatted_time': ('derived', None, 'i8'),   # utc, seconds since 1970-01-01
+    }
+ATTRS = {'formatted_time': {'units': 'seconds since 1970-01-01 00:00:00'}}
+GROUP = ["./gt1l", "./gt1r", "./gt2l", "./gt2r", "./gt3l", "./gt3r"]
+
+
+def get_args():
+    description = "read ICESat-2 ATL03/ATL06/ATL08/ATL13 data files by groud track and orbit."
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+            "ifiles", metavar="ifiles", type=str, nargs="+",
+            help="input files to read (.h5).")
+    parser.add_argument(
+            '-p', metavar=('product'), dest='product', type=str, nargs=1,
+            help='icesat2 product', choices=list(PRODUCTS.keys()),
+            default=['atl06'])
+    parser.add_argument(
+            '-v', metavar=('var'), dest='vnames', type=str, nargs='+',
+            help='only read specific vars if given, otherwise the default vars of the product',
+            default=[])
+    parser.add_argument(
+            '-b', metavar=('w','e','s','n'), dest='bbox', type=float, nargs=4,
+            help=('only read the points within the bbox (lon/lat)'),
+            default=None)
+    parser.add_argument(
+            '-g', metavar=('vector_file'), dest='vector_file', type=str, nargs=1,
+            help=('only read the points within the polygons of the vector file (.gpkg/.shp)'),
+            default=[None])
+    parser.add_argument(
+            '-e', metavar=('epsg_num'), dest='proj', type=str, nargs=1,
+            help=('also write the projected coordinates (x/y) of the epsg, e.g., 3031'),
+            default=[None])
+    parser.add_argument(
+            '-o', metavar=('outdir'), dest='outdir', type=str, nargs=1,
+            help='path to output folder',
+            default=[""])
+    parser.add_argument(
+            "-n", metavar=("njobs"), dest="njobs", type=int, nargs=1,
+            help="number of cores to use for parallel processing",
+            default=[1])
+    return parser.parse_args()
+
+
+def orbit_type(time, lat):
+    """
+    des: determines ascending and descending tracks
+         through testing whether lat increases when time increases.
+    arg:
+        time, lat: time and latitute of the pohton points.
+    return:
+        i_asc, i_des: track of the photon points, 1-d data consist of True/Talse.
+    """
+    tracks = np.zeros(lat.shape)
+    # set track values, !!argmax: the potential turn point of the track
+    tracks[0: np.argmax(np.abs(lat))] = 1
+    i_asc = np.zeros(tracks.shape, dtype=bool)
+
+    # loop through unique tracks: [0]/[1]/[0,1]
+    for track in np.unique(tracks):
+        (i_track,) = np.where(track == tracks)
+        if len(i_track) < 2:  # number of photon points of specific track i
+            continue
+        i_time_min, i_time_max  = time[i_track].argmin(), time[i_track].argmax()
+        lat_diff = lat[i_track][i_time_max] - lat[i_track][i_time_min]
+        # Determine track type
+        if lat_diff > 0:
+            i_asc[i_track] = True
+    # the single point of a track (the latitude extreme is the second/last point)
+    # is in the other part of the orbit, i.e., opposite to its neighbour
+    i_turn = np.argmax(np.abs(lat)) if len(lat) else 0
+    if len(lat) == 2 and i_turn == 1:   # two points: moving to the extreme, and the extreme
+        i_asc[0] = (lat[1] - lat[0]) * (time[1] - time[0]) > 0
+        i_asc[1] = ~i_asc[0]
+    elif len(lat) > 2 and i_turn == 1:
+        i_asc[0] = ~i_asc[1]
+    elif len(lat) > 1 and i_turn == len(lat) - 1:
+        i_asc[-1] = ~i_asc[-2]
+    return i_asc, np.invert(i_asc)
+
+
+def orbit_type_rows(ds_time, ds_lat, row, time=None):
+    """
+    des: orbit type of the rows of a beam, only the rows and one neighbouring point 
+         on each side are read, the result is same to orbit_type() of the whole beam.
+    arg:
+        ds_time, ds_lat: time and latitude (h5 datasets or arrays) of the beam.
+        row: slice, rows of the beam.
+        time: the time (ds_time[row]) if it has been read.
+    return:
+        i_asc, i_des: track of the points of the rows.
+    """
+    n = ds_lat.shape[0]
+    r0, r1, _ = row.indices(n)
+    r1 = max(r0, r1)
+    e0, e1 = max(r0 - 1, 0), min(r1 + 1, n)
+    time = ds_time[r0:r1] if time is None else time
+    time = np.concatenate([ds_time[e0:r0], time, ds_time[r1:e1]])
+    (i_asc, i_des) = orbit_type(time, ds_lat[e0:e1])
+    i_asc = i_asc[r0 - e0:r1 - e0]
+    return i_asc, np.invert(i_asc)
+
+
+def get_schema(product, keys=None):
+    """
+    des: schema of the requested variables.
+    arg:
+        product: 'atl03', 'atl06', 'atl08' or 'atl13'.
+        keys: list, the requested output variables, None: the default variables.
+    return:
+        keys, vars: requested variables and the (source, path, dtype) of them.
+    """
+    schema = PRODUCTS[product.lower()]
+    keys = list(schema['keys']) if not keys else list(keys)
+    vars_all = dict(schema['vars'], **DERIVED)
+    missing = [key for key in keys if key not in vars_all]
+    if missing:
+        raise ValueError('variables %s are not defined for %s, available: %s'
+                                    % (missing, product, list(vars_all.keys())))
+    return keys, {key: vars_all[key] for key in keys}
+
+
+def get_rows(lat, lat_min, lat_max):
+    """
+    des: row range of the points within [lat_min, lat_max]. 
+         searchsorted is used if the latitude is monotonic along track,
+         otherwise the range covers the first and last points within the latitude range.
+    arg:
+        lat: latitude of the beam.
+        lat_min, lat_max: latitude range.
+    return:
+        rows: slice, [r0, r1) of the points.
+    """
+    if len(lat) == 0:
+        return slice(0, 0)
+    dlat = np.diff(lat)
+    if np.all(dlat >= 0):
+        r0 = np.searchsorted(lat, lat_min, side='left')
+        r1 = np.searchsorted(lat, lat_max, side='right')
+    elif np.all(dlat <= 0):
+        r0 = np.searchsorted(-lat, -lat_max, side='left')
+        r1 = np.searchsorted(-lat, -lat_min, side='right')
+    else:
+        idx = np.flatnonzero((lat >= lat_min) & (lat <= lat_max))
+        r0, r1 = (idx[0], idx[-1] + 1) if len(idx) > 0 else (0, 0)
+    return slice(int(r0), int(max(r0, r1)))
+
+
+def size_beams(fi, schema, bbox=None, polygon=None):
+    """
+    des: the existing beams and their valid points.
+    arg:
+        fi: opened h5 file.
+        schema: product schema.
+        bbox: [lon_min, lon_max, lat_min, lat_max], only read the points within the bbox.
+        polygon: shapely geometry (wgs84), only read the points within the polygon.
+    return:
+        beams: list, path of the beam groups.
+        rows: list, slice of the rows (hyperslab) to be read of each beam.
+        sels: list, bool array of the valid points (or slice of all points) within the rows.
+        nums: list, number of the selected points of each beam.
+    """
+    if polygon is not None:
+        lon_min, lat_min, lon_max, lat_max = polygon.bounds
+        if bbox is not None:
+            lon_min, lon_max = max(lon_min, bbox[0]), min(lon_max, bbox[1])
+            lat_min, lat_max = max(lat_min, bbox[2]), min(lat_max, bbox[3])
+        bbox = [lon_min, lon_max, lat_min, lat_max]
+    beams, rows, sels, nums = [], [], [], []
+    for group in GROUP:
+        path = os.path.join(group, schema['beam_group'])
+        try:
+            if bbox is not None:
+                ## hyperslab of the region from the latitude
+                lat = fi[os.path.join(path, schema['lat'])][:]
+                row = get_rows(lat, bbox[2], bbox[3])
+                lon = fi[os.path.join(path, schema['lon'])][row]
+                sel = (lon >= bbox[0]) & (lon <= bbox[1]) & \
+                                (lat[row] >= bbox[2]) & (lat[row] <= bbox[3])
+                if polygon is not None:
+                    sel[sel] = points_in_polygon(lon[sel], lat[row][sel], polygon)
+            else:
+                row, sel = slice(None), slice(None)
+            if schema['filter'] is not None:
+                var, value = schema['filter']
+                valid = fi[os.path.join(path, var)][row] == value
+                sel = valid if isinstance(sel, slice) else sel & valid
+            if isinstance(sel, slice):
+                num = len(range(*row.indices(fi[os.path.join(path, schema['lat'])].shape[0])))
+            else:
+                num = int(sel.sum())
+        except KeyError:
+            continue
+        beams.append(group)
+        rows.append(row)
+        sels.append(sel)
+        nums.append(num)
+    return beams, rows, sels, nums
+
+
+def read_granule(file_in, product='atl06', keys=None, bbox=None, polygon=None):
+    '''
+    des:
+        read icesat2 granule by ground tracks/spots.
+        spot 1,2,3,4,5,6 are always corresponding to beam 1,2,3,4,5,6
+        and spot 1,3,5 are strong beams, spot 2, 4, 6 are weak beams.
+        users can add the interested variables to the PRODUCTS schema.
+        if bbox/polygon is given, the row range of the region is found from the 
+        latitude, and only the hyperslab of the other variables are read.
+    arg:
+        file_in: icesat2 granule, .h5 format
+        product: 'atl03', 'atl06', 'atl08' or 'atl13'.
+        keys: list, variables to be read, None: the default variables of the product.
+        bbox: [lon_min, lon_max, lat_min, lat_max], region of the points to be read.
+        polygon: shapely geometry (wgs84), region of the points to be read. 
+    return:
+        d: dict, the selected variables of the beams (concatenated).
+    '''
+    schema = PRODUCTS[product.lower()]
+    keys, vars_sel = get_schema(product, keys)
+
+    with h5py.File(file_in, "r") as fi:
+        #-----------------------------------------#
+        # 1) size the beams and preallocate       #
+        #-----------------------------------------#
+        beams, rows, sels, nums = size_beams(fi, schema, bbox, polygon)
+        for group in GROUP:
+            if group not in beams:
+                print(("missing group:", group))
+                print(("in file:", file_in))
+        d = {}
+        for key, (source, path, dtype) in vars_sel.items():
+            shape = (sum(nums),)
+            if source == 'beam' and beams:
+                shape += fi[os.path.join(beams[0], schema['beam_group'], path)].shape[1:]
+            d[key] = np.empty(shape, dtype=dtype)
+        need_time = any(key in vars_sel for key in ['t_dyr', 'orbit_type', 'formatted_time'])
+        ## granule variables
+        if need_time:
+            tref = fi["/ancillary_data/atlas_sdp_gps_epoch"][0]
+        granule = {key: fi[path][0] for key, (source, path, _) in vars_sel.items()
+                                                            if source == 'granule'}
+
+        #-----------------------------------#
+        # 2) Read data for beams            #
+        #-----------------------------------#
+        i0 = 0
+        for beam, row, sel, num in zip(beams, rows, sels, nums):
+            i1 = i0 + num
+            if num == 0:
+                continue
+            path_beam = os.path.join(beam, schema['beam_group'])
+            for key, (source, path, _) in vars_sel.items():
+                if source == 'beam':
+                    dset = fi[os.path.join(path_beam, path)]
+                    if isinstance(sel, slice):
+                        dset.read_direct(d[key], source_sel=row, dest_sel=np.s_[i0:i1])
+                    else:
+                        d[key][i0:i1] = dset[row][sel]
+                elif source == 'granule':
+                    d[key][i0:i1] = granule[key]
+            ## group attributes, set beam type: 1 -> strong, 0 -> weak
+            if 'beam_type' in vars_sel:
+                beam_type = fi[beam].attrs["atlas_beam_type"].decode()
+                d['beam_type'][i0:i1] = 1 if beam_type == "strong" else 0
+            if 'spot' in vars_sel:
+                d['spot'][i0:i1] = float(fi[beam].attrs["atlas_spot_number"].decode())
+
+            #----------------------------------------------------#
+            # 3) obtain time and orbit orientation with time:
+            #    ascending -> 1, descending -> 0                 #
+            #----------------------------------------------------#
+            if need_time:
+                t_beam = fi[os.path.join(path_beam, schema['time'])][row]
+                t_gps = t_beam + tref
+                if 't_dyr' in vars_sel:
+                    d['t_dyr'][i0:i1] = gps2dyr(t_gps[sel])      # time in decimal years
+                if 'formatted_time' in vars_sel:
+                    d['formatted_time'][i0:i1] = gps2dt64(t_gps[sel], unit='s').astype('int64')
+                if 'orbit_type' in vars_sel:
+                    ### --- orbit orientation of the rows (before the point selection)
+                    (i_asc, i_des) = orbit_type_rows(fi[os.path.join(path_beam, schema['time'])], 
+                                        fi[os.path.join(path_beam, schema['lat'])], row, t_beam)
+                    d['orbit_type'][i0:i1] = i_asc[sel]
+            i0 = i1
+    return d
+
+
+def write_readout(d, file_in, dir_out, proj=None):
+    '''
+    des: write out the read variables to dir_out/{name}_readout.h5
+    arg:
+        proj: epsg number, if given, the projected coordinates (x/y) are also written.
+    '''
+    name, ext = os.path.splitext(os.path.basename(file_in))
+    file_out = os.path.join(dir_out, name + "_" + "readout" + ext)
+    with h5py.File(file_out, "w") as f_out:
+        for key in d:
+            f_out.create_dataset(key, data=d[key])
+            for attr, value in ATTRS.get(key, {}).items():
+                f_out[key].attrs[attr] = value
+        if proj is not None:
+            write_xy(f_out, d['lon'], d['lat'], proj)
+    print('written file:', file_out)
+    return file_out
+
+
+def readout(file_in, dir_out, product='atl06', keys=None, bbox=None, polygon=None, proj=None):
+    ''' des: read the granule and write out the readout file (with x/y of the epsg proj if given). 
+             the file is not written if no point is within the given region.
+    '''
+    if proj is not None and keys:
+        keys = list(keys) + [key for key in ['lon', 'lat'] if key not in keys]
+    d = read_granule(file_in, product=product, keys=keys, bbox=bbox, polygon=polygon)
+    if (bbox is not None or polygon is not None) and len(list(d.values())[0]) == 0:
+        print('no points in the region:', file_in)
+        return
+    write_readout(d, file_in, dir_out, proj)
+    return
+
+
+if __name__ == '__main__':
+
+    ### ---- read input from command line
+    args = get_args()
+    ifiles = args.ifiles
+    product = args.product[0]
+    vnames = args.vnames
+    bbox = args.bbox
+    vector_file = args.vector_file[0]
+    dir_out = args.outdir[0]
+    proj = args.proj[0]
+    njobs = args.njobs[0]
+    polygon = read_polygon(vector_file) if vector_file else None
+
+    if njobs == 1:
+        print("running in serial ...")
+        [readout(f, dir_out, product, vnames, bbox, polygon, proj) for f in ifiles]
+    else:
+        print(("running in parallel (%d jobs) ..." % njobs))
+        from joblib import Parallel, delayed
+        Parallel(n_jobs=njobs, verbose=5)(
+                delayed(readout)(f, dir_out, product, vnames, bbox, polygon, proj) for f in ifiles)
@@ -0,0 +1,213 @@
+## author: xin luo
+## create: 2026.10.18
+## des: footprint catalog (sqlite) of the readout files, the candidate files of a
+##      region/time range are selected by the catalog before opening any h5 file.
+
+'''
+des: 1. for each readout file, the lon/lat bbox, time range, rgts, cycles, spots,
+        number of points and the file mtime/size/hash are recorded in a sqlite database.
+     2. the catalog is updated incrementally, only the new or modified files
+        (mtime or size changed) are opened.
+     3. select_files() returns the candidate files, it is used by the -cat option
+        of subset_file.py, split_tiles.py and merge_files.py.
+example:
+    python readout_catalog.py ./readout/*_readout.h5 -o ./readout/catalog.db -n 8
+    python subset_file.py ./readout/*_readout.h5 -r 90 91 30 31 -cat ./readout/catalog.db
+'''
+
+import os
+import sys
+import h5py
+import sqlite3
+import hashlib
+import argparse
+import numpy as np
+from glob import glob
+from joblib import Parallel, delayed
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.transform_xy import get_transformer
+
+COLUMNS = ['path', 'lon_min', 'lon_max', 'lat_min', 'lat_max', 't_min', 't_max',
+                'rgts', 'cycles', 'spots', 'npts', 'mtime', 'size', 'hash']
+
+def get_args():
+    """ Get command-line arguments. """
+    parser = argparse.ArgumentParser(
+            description='build/update the footprint catalog of readout files')
+    parser.add_argument(
+            'ifiles', metavar='ifiles', type=str, nargs='+',
+            help='readout files (HDF5)')
+    parser.add_argument(
+            '-o', metavar='catalog', dest='catalog', type=str, nargs=1,
+            help='catalog file (sqlite), updated if it exists',
+            required=True)
+    parser.add_argument(
+            '-c', metavar=('lon','lat'), dest='coord_name', type=str, nargs=2,
+            help=('name of lon/lat variables'),
+            default=['lon', 'lat'])
+    parser.add_argument(
+            '-v', metavar=('time', 'rgt', 'cycle', 'spot'), dest='var_name', type=str, nargs=4,
+            help=('name of time/rgt/cycle/spot variables'),
+            default=['t_dyr', 'rgt', 'cycle', 'spot'])
+    parser.add_argument(
+            '-n', metavar=('njobs'), dest='njobs', type=int, nargs=1,
+            help="number of cores to use for parallel processing",
+            default=[1],)
+    return parser.parse_args()
+
+
+def file_hash(ifile, block=1<<20):
+    """ des: sha1 of the file content. """
+    sha1 = hashlib.sha1()
+    with open(ifile, 'rb') as f:
+        for data in iter(lambda: f.read(block), b''):
+            sha1.update(data)
+    return sha1.hexdigest()
+
+
+def join_ids(values):
+    """ des: unique integer ids as a string, e.g., ',12,1034,', for the LIKE query. """
+    values = values[np.isfinite(values)] if values.dtype.kind == 'f' else values
+    return ',' + ','.join(str(int(v)) for v in np.unique(values)) + ','
+
+
+def file_summary(ifile, coord_name=['lon', 'lat'], var_name=['t_dyr', 'rgt', 'cycle', 'spot']):
+    """
+    des: footprint summary of a readout file.
+    arg:
+        ifile: readout file (h5, 1-d datasets).
+        coord_name, var_name: variable names of lon/lat and time/rgt/cycle/spot,
+                    the missing rgt/cycle/spot variables are recorded as ''.
+    return:
+        summary: list, values of the COLUMNS.
+    """
+    lon_name, lat_name = coord_name
+    time_name, *id_names = var_name
+    stat = os.stat(ifile)
+    with h5py.File(ifile, 'r') as fi:
+        lon, lat, t = fi[lon_name][:], fi[lat_name][:], fi[time_name][:]
+        ids = [join_ids(fi[name][:]) if name in fi else '' for name in id_names]
+    valid = np.isfinite(lon) & np.isfinite(lat)
+    npts = int(valid.sum())
+    if npts > 0:
+        bbox = [lon[valid].min(), lon[valid].max(), lat[valid].min(), lat[valid].max(),
+                                            np.nanmin(t[valid]), np.nanmax(t[valid])]
+    else:
+        bbox = [None] * 6
+    return [os.path.abspath(ifile)] + [None if v is None else float(v) for v in bbox] + \
+                ids + [npts, stat.st_mtime, stat.st_size, file_hash(ifile)]
+
+
+def connect(catalog):
+    """ des: connect to the catalog, the table is created if not exists. """
+    con = sqlite3.connect(catalog)
+    con.execute('CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, '
+                'lon_min REAL, lon_max REAL, lat_min REAL, lat_max REAL, t_min REAL, t_max REAL, '
+                'rgts TEXT, cycles TEXT, spots TEXT, npts INTEGER, '
+                'mtime REAL, size INTEGER, hash TEXT)')
+    return con
+
+
+def is_updated(con, ifile):
+    """ des: True if the file is recorded and not modified (same mtime and size). """
+    row = con.execute('SELECT mtime, size FROM files WHERE path=?',
+                                    (os.path.abspath(ifile),)).fetchone()
+    if row is None:
+        return False
+    stat = os.stat(ifile)
+    return row[0] == stat.st_mtime and row[1] == stat.st_size
+
+
+def update_catalog(catalog, ifiles, coord_name=['lon', 'lat'],
+                        var_name=['t_dyr', 'rgt', 'cycle', 'spot'], njobs=1):
+    """
+    des: add the new/modified files to the catalog, and remove the missing files.
+    return:
+        num: number of the updated files.
+    """
+    con = connect(catalog)
+    paths = con.execute('SELECT path FROM files').fetchall()
+    missing = [(p,) for p, in paths if not os.path.exists(p)]
+    ifiles_up = [f for f in ifiles if not is_updated(con, f)]
+    summaries = Parallel(n_jobs=njobs)(
+            delayed(file_summary)(f, coord_name, var_name) for f in ifiles_up)
+    with con:
+        con.executemany('DELETE FROM files WHERE path=?', missing)
+        con.executemany('INSERT OR REPLACE INTO files VALUES (%s)' %
+                            ','.join('?' * len(COLUMNS)), summaries)
+    con.close()
+    return len(summaries)
+
+
+def proj_bbox(lon_min, lon_max, lat_min, lat_max, transformer, nedge=20):
+    """ des: bbox of the projected lon/lat bbox (the edges are densified). """
+    lon_e = np.linspace(lon_min, lon_max, nedge)
+    lat_e = np.linspace(lat_min, lat_max, nedge)
+    lon = np.r_[lon_e, lon_e, np.full(nedge, lon_min), np.full(nedge, lon_max)]
+    lat = np.r_[np.full(nedge, lat_min), np.full(nedge, lat_max), lat_e, lat_e]
+    x, y = transformer.transform(lon, lat)
+    return np.nanmin(x), np.nanmax(x), np.nanmin(y), np.nanmax(y)
+
+
+def select_files(catalog, ifiles=None, extent=None, time_range=None,
+                                rgt=None, cycle=None, spot=None, proj=None):
+    """
+    des: candidate files of given region, time range, rgt, cycle and spot.
+    arg:
+        catalog: the catalog file (sqlite).
+        ifiles: the files to be selected, None: all files in the catalog. the files
+                not recorded (or modified after recording) are always selected.
+        extent: [xmin, xmax, ymin, ymax], lon/lat, or projected coordinates if proj is given.
+        time_range: [t_start, t_end], same unit as the time variable of the catalog.
+        rgt, cycle, spot: int, the files containing the given rgt/cycle/spot.
+        proj: epsg number of the extent, None: wgs84 (lon/lat).
+    return:
+        files: list, the candidate files.
+    """
+    con = connect(catalog)
+    query, params = 'SELECT path, lon_min, lon_max, lat_min, lat_max FROM files WHERE npts > 0', []
+    if extent is not None and (proj is None or int(proj) == 4326):
+        query += ' AND lon_max >= ? AND lon_min <= ? AND lat_max >= ? AND lat_min <= ?'
+        params += list(extent)
+    if time_range is not None and time_range[0] is not None:
+        query += ' AND t_max >= ? AND t_min <= ?'
+        params += list(time_range)
+    for name, value in zip(['rgts', 'cycles', 'spots'], [rgt, cycle, spot]):
+        if value is not None:
+            query += ' AND %s LIKE ?' % name
+            params.append('%%,%d,%%' % int(value))
+    rows = con.execute(query, params).fetchall()
+    if extent is not None and proj is not None and int(proj) != 4326:
+        transformer = get_transformer(4326, proj)
+        xmin, xmax, ymin, ymax = extent
+        rows_proj = []
+        for row in rows:
+            bx0, bx1, by0, by1 = proj_bbox(*row[1:], transformer)
+            if bx1 >= xmin and bx0 <= xmax and by1 >= ymin and by0 <= ymax:
+                rows_proj.append(row)
+        rows = rows_proj
+    selected = {row[0] for row in rows}
+    if ifiles is None:
+        files = sorted(selected)
+    else:
+        files = [f for f in ifiles if os.path.abspath(f) in selected or not is_updated(con, f)]
+    con.close()
+    return files
+
+
+if __name__ == '__main__':
+
+    args = get_args()
+    ifiles = args.ifiles[:]
+    catalog = args.catalog[0]
+    coord_name = args.coord_name[:]
+    var_name = args.var_name[:]
+    njobs = args.njobs[0]
+
+    if len(ifiles) == 1:
+        ifiles = glob(ifiles[0])
+    ifiles = sorted(ifiles)
+
+    num = update_catalog(catalog, ifiles, coord_name, var_name, njobs)
+    print('number of files: %d, updated: %d' % (len(ifiles), num))
+    print('output ->', catalog)
@@ -0,0 +1,254 @@
+## author: xin luo
+## create: 2026.10.18
+## des: export readout files (*_readout.h5) to a partitioned columnar store (parquet),
+##      and read the store with partition/row-group pruning.
+
+'''
+des: 1. the points of each readout file are written to the partitions
+        root/tile=<tile>/year=<yyyy>/month=<mm>/<readout name>_<path hash>.parquet,
+        the hash of the absolute path keeps the readout files of the same name 
+        (in different directories) apart,
+        the tile is the lon/lat grid cell (dxy degree). the points are sorted by
+        time within each partition file, so that the row-group statistics
+        (min/max, written by parquet) are tight.
+     2. the statistics of each partition file (bbox, time range, number of points)
+        are kept in root/_stats.parquet, re-exporting a readout file replaces its rows.
+     3. read_store() selects the partition files by the statistics, and the
+        row groups/points by the bbox, time and quality flag predicates.
+example:
+    python readout_store.py ./readout/*_readout.h5 -o ./store -d 1 -n 8
+    ### query (e.g., in notebook):
+    from utils_main.readout_store import read_store
+    data = read_store('./store', bbox=[90, 91, 30, 31], time_range=[2019, 2021],
+                                    filters=[('atl06_quality_summary', '==', 0)])
+'''
+
+import os
+import sys
+import h5py
+import hashlib
+import argparse
+import numpy as np
+from glob import glob
+from joblib import Parallel, delayed
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.time_convert import dyr2dt64
+
+STATS_NAME = '_stats.parquet'
+
+def get_args():
+    """ Get command-line arguments. """
+    parser = argparse.ArgumentParser(
+            description='export readout files to the partitioned parquet store')
+    parser.add_argument(
+            'ifiles', metavar='ifiles', type=str, nargs='+',
+            help='readout files (HDF5)')
+    parser.add_argument(
+            '-o', metavar='root', dest='root', type=str, nargs=1,
+            help='root directory of the store',
+            required=True)
+    parser.add_argument(
+            '-d', metavar=('dxy'), dest='dxy', type=float, nargs=1,
+            help=('tile size of the partitions (degree)'),
+            default=[1.0],)
+    parser.add_argument(
+            '-c', metavar=('lon','lat'), dest='coord_name', type=str, nargs=2,
+            help=('name of lon/lat variables'),
+            default=['lon', 'lat'])
+    parser.add_argument(
+            '-tn', metavar=('time_name'), dest='time_name', type=str, nargs=1,
+            help=('name of time variable (decimal year)'),
+            default=['t_dyr'])
+    parser.add_argument(
+            '-g', metavar=('row_group'), dest='row_group', type=int, nargs=1,
+            help=('number of rows of each row group'),
+            default=[100000],)
+    parser.add_argument(
+            '-n', metavar=('njobs'), dest='njobs', type=int, nargs=1,
+            help="number of cores to use for parallel processing",
+            default=[1],)
+    return parser.parse_args()
+
+
+def tile_name(ix, iy, dxy):
+    """ des: name of the tile (lon/lat grid cell), e.g., 'E090N30'
+             is the tile whose lower left corner is (90E, 30N).
+    """
+    lon, lat = ix * dxy, iy * dxy
+    fmt_lon, fmt_lat = ('%03d', '%02d') if float(dxy).is_integer() else ('%06.2f', '%05.2f')
+    return ('E' if lon >= 0 else 'W') + fmt_lon % abs(lon) + \
+                ('N' if lat >= 0 else 'S') + fmt_lat % abs(lat)
+
+
+def part_name(ifile):
+    """ des: name of the partition files of a readout file, the readout name and 
+             the hash (sha1, 8 characters) of its absolute path, e.g., 'xxx_readout_1a2b3c4d.parquet'.
+    """
+    path_hash = hashlib.sha1(os.path.abspath(ifile).encode()).hexdigest()[:8]
+    return os.path.splitext(os.path.basename(ifile))[0] + '_' + path_hash + '.parquet'
+
+
+def export_readout(ifile, root, dxy=1.0, coord_name=['lon', 'lat'],
+                                time_name='t_dyr', row_group=100000):
+    """
+    des: write the points of a readout file into the partitions of the store.
+    arg:
+        ifile: readout file (h5, 1-d datasets).
+        root: root directory of the store.
+        dxy: tile size (degree).
+        coord_name, time_name: variable names in the readout file, the time
+                is decimal year.
+        row_group: number of rows of each row group.
+    return:
+        stats: list of dict, statistics of the written partition files.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    lon_name, lat_name = coord_name
+    with h5py.File(ifile, 'r') as fi:
+        data = {key: fi[key][:] for key in fi.keys() if fi[key].ndim == 1}
+    lon, lat, t = data[lon_name], data[lat_name], data[time_name]
+    valid = np.isfinite(lon) & np.isfinite(lat) & np.isfinite(t)
+    if not valid.all():
+        data = {key: value[valid] for key, value in data.items()}
+        lon, lat, t = data[lon_name], data[lat_name], data[time_name]
+    if len(t) == 0:
+        return []
+    ## partition keys of the points
+    ix = np.floor(lon / dxy).astype(np.int64)
+    iy = np.floor(lat / dxy).astype(np.int64)
+    ym = dyr2dt64(t, 's').astype('datetime64[M]').astype(np.int64)   # months since 1970
+    isort = np.lexsort((t, ym, iy, ix))
+    keys = np.column_stack([ix, iy, ym])[isort]
+    start = np.flatnonzero(np.r_[True, np.any(keys[1:] != keys[:-1], axis=1)])
+    end = np.r_[start[1:], len(isort)]
+    table = pa.table({key: value[isort] for key, value in data.items()})
+    name = part_name(ifile)
+    stats = []
+    for i1, i2 in zip(start, end):
+        ix_, iy_, ym_ = keys[i1]
+        year, month = 1970 + ym_ // 12, ym_ % 12 + 1
+        dir_part = os.path.join(root, 'tile=' + tile_name(ix_, iy_, dxy),
+                                'year=%04d' % year, 'month=%02d' % month)
+        os.makedirs(dir_part, exist_ok=True)
+        path_part = os.path.join(dir_part, name)
+        pq.write_table(table.slice(i1, i2 - i1), path_part,
+                                    row_group_size=row_group, compression='zstd')
+        idx = isort[i1:i2]
+        stats.append({'path': os.path.relpath(path_part, root), 'ifile': os.path.abspath(ifile),
+                      'lon_min': lon[idx].min(), 'lon_max': lon[idx].max(),
+                      'lat_min': lat[idx].min(), 'lat_max': lat[idx].max(),
+                      't_min': t[idx].min(), 't_max': t[idx].max(), 'npts': i2 - i1})
+    return stats
+
+
+def update_stats(root, stats, ifiles=None):
+    """
+    des: update the statistics file of the store, the old rows of the
+         re-exported files (ifiles) are replaced.
+    arg:
+        root: root directory of the store.
+        stats: list of dict, by export_readout().
+        ifiles: the exported readout files.
+    """
+    import pandas as pd
+    path_stats = os.path.join(root, STATS_NAME)
+    stats_df = pd.DataFrame(stats)
+    if os.path.exists(path_stats):
+        stats_old = pd.read_parquet(path_stats)
+        if ifiles is not None:
+            ifiles = [os.path.abspath(f) for f in ifiles]
+            redone = stats_old['ifile'].isin(ifiles).values
+            # remove the partition files that are not re-written.
+            for path in set(stats_old['path'].values[redone]) - set(stats_df.get('path', [])):
+                if os.path.exists(os.path.join(root, path)):
+                    os.remove(os.path.join(root, path))
+            stats_old = stats_old[~redone]
+        stats_old = stats_old[~stats_old['path'].isin(stats_df.get('path', []))]
+        stats_df = pd.concat([stats_old, stats_df], ignore_index=True)
+    stats_df.to_parquet(path_stats, index=False)
+    return stats_df
+
+
+def select_parts(root, bbox=None, time_range=None):
+    """
+    des: select the partition files by the statistics.
+    arg:
+        bbox: [lon_min, lon_max, lat_min, lat_max], None: no constraint.
+        time_range: [t_start, t_end] (decimal year), None: no constraint.
+    return:
+        paths: the selected partition files (absolute path).
+    """
+    import pandas as pd
+    stats_df = pd.read_parquet(os.path.join(root, STATS_NAME))
+    keep = np.ones(len(stats_df), dtype=bool)
+    if bbox is not None:
+        lon_min, lon_max, lat_min, lat_max = bbox
+        keep &= (stats_df['lon_max'].values >= lon_min) & (stats_df['lon_min'].values <= lon_max) & \
+                (stats_df['lat_max'].values >= lat_min) & (stats_df['lat_min'].values <= lat_max)
+    if time_range is not None:
+        t_start, t_end = time_range
+        keep &= (stats_df['t_max'].values >= t_start) & (stats_df['t_min'].values <= t_end)
+    return [os.path.join(root, p) for p in stats_df['path'].values[keep]]
+
+
+def read_store(root, bbox=None, time_range=None, filters=None, columns=None,
+                            coord_name=['lon', 'lat'], time_name='t_dyr'):
+    """
+    des: read the points of the store, the partition files are pruned by the
+         statistics, and the row groups are pruned by the predicates.
+    arg:
+        root: root directory of the store.
+        bbox: [lon_min, lon_max, lat_min, lat_max], None: no constraint.
+        time_range: [t_start, t_end] (decimal year), None: no constraint.
+        filters: list of (column, op, value), e.g., [('atl06_quality_summary', '==', 0)],
+                 the op is one of '==', '!=', '<', '<=', '>', '>=', 'in', 'not in'.
+        columns: the columns to read, None: all columns.
+    return:
+        data: dict, {column: 1-d array}
+    """
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    lon_name, lat_name = coord_name
+    paths = select_parts(root, bbox, time_range)
+    if len(paths) == 0:
+        return {}
+    dataset = ds.dataset(paths, format='parquet')
+    expr = None
+    if filters:
+        expr = pq.filters_to_expression(filters)
+    if bbox is not None:
+        lon_min, lon_max, lat_min, lat_max = bbox
+        expr_bbox = (ds.field(lon_name) >= lon_min) & (ds.field(lon_name) <= lon_max) & \
+                        (ds.field(lat_name) >= lat_min) & (ds.field(lat_name) <= lat_max)
+        expr = expr_bbox if expr is None else expr & expr_bbox
+    if time_range is not None:
+        expr_time = (ds.field(time_name) >= time_range[0]) & (ds.field(time_name) <= time_range[1])
+        expr = expr_time if expr is None else expr & expr_time
+    table = dataset.to_table(columns=columns, filter=expr)
+    return {key: table.column(key).to_numpy() for key in table.column_names}
+
+
+if __name__ == '__main__':
+
+    args = get_args()
+    ifiles = args.ifiles[:]
+    root = args.root[0]
+    dxy = args.dxy[0]
+    coord_name = args.coord_name[:]
+    time_name = args.time_name[0]
+    row_group = args.row_group[0]
+    njobs = args.njobs[0]
+
+    if len(ifiles) == 1:
+        ifiles = glob(ifiles[0])
+    ifiles = sorted(ifiles)
+    os.makedirs(root, exist_ok=True)
+
+    print('exporting %d files ...' % len(ifiles))
+    stats = Parallel(n_jobs=njobs, verbose=5)(
+            delayed(export_readout)(f, root, dxy, coord_name, time_name, row_group) for f in ifiles)
+    stats = [s for stats_file in stats for s in stats_file]
+    stats_df = update_stats(root, stats, ifiles)
+    print('number of partition files:', len(stats_df))
+    print('output ->', root)
@@ -1,9 +1,10 @@
 ## author: Fernando Paolo
-## improve: xin luo, 2022.10.6
+## improve: xin luo, 2022.10.6; 2026.10.18
 ## split file into multiple tiles by given meter or degree. if by meter, the coordinates should projected.
 ##    if by degreen ,the coordinates should be wgs84 (epsg:4326)
 ## usage: python split_tiles.py pineisland_ATL06_201901.h5 -d 15000 15000 -c lon lat -p 3031 -n 4
 ##     or python split_tiles.py pineisland_ATL06_201901.h5 -d 0.15 0.15 -c lon lat -p 4326 -n 4
+##     or python split_tiles.py ./readout/*_readout.h5 -b -1600000 -1400000 -400000 -200000 -d 15000 15000 -cat ./readout/catalog.db
 
 """
 des: split the very-large files into multiple tiles by distance (km)/degree.
@@ -11,14 +12,12 @@ des: split the very-large files into multiple tiles by distance (km)/degree.
 
 import os
 import h5py 
-import pyproj
 import argparse
 import numpy as np
 from glob import glob
 from joblib import Parallel, delayed
-
-# Optimal chunk size of points.
-chunks = 100000
+from readout_catalog import select_files
+from add_xy import read_xy
 
 def get_args():
     """ Get command-line arguments. """
@@ -49,8 +48,12 @@ def get_args():
             default=['3031'],)
     parser.add_argument(
             '-n', metavar=('njobs'), dest='njobs', type=int, nargs=1,
-            help="for parallel writing of multiple tiles, optional",
+            help="for parallel writing of the tiles of each file, optional",
             default=[1],)
+    parser.add_argument(
+            '-cat', metavar=('catalog'), dest='catalog', type=str, nargs=1,
+            help="footprint catalog (sqlite, by readout_catalog.py) for selecting the candidate files",
+            default=[None],)
     return parser.parse_args()
 
 
@@ -59,30 +62,12 @@ def print_args(args):
     for arg in list(vars(args).items()):
         print(arg)
 
-def coor2coor(srs_from, srs_to, x, y):
-    """
-    Transform coordinates from srs_from to srs_to
-    input:
-        srs_from and srs_to are EPSG number (e.g., 4326, 3031)
-        x and y are x-coord and y-coord corresponding to srs_from    
-    return:
-        x-coord and y-coord in srs_to 
-    """
-    try:
-        transformer = pyproj.Transformer.from_crs(srs_from, srs_to,always_xy=True)
-        return transformer.transform(x,y)
-    except Exception as e:
-        print(f"Rrror transforming coordinate:{e}")
-        return None,None
-
-def get_xy(ifile, coord_name=['lon', 'lat'], proj='3031'):
-    """ Get lon/lat from input file and convert to x/y. """
-    lonvar, latvar = coord_name
+def get_xy(ifile, coord_name=['lon', 'lat'], proj='3031', njobs=1):
+    """ Get x/y of the points, the stored x/y (same epsg, see add_xy.py) are reused, 
+        otherwise lon/lat are read and converted to x/y (njobs threads). """
     try:
         with h5py.File(ifile,'r') as fi:
-            lon = fi[lonvar][:]
-            lat = fi[latvar][:]
-        return coor2coor(4326, proj, lon, lat)
+            return read_xy(fi, proj, coord_name, njobs)
     except KeyError as e:
         print(f"Error :Coordinate variable {e} not found in file {ifile}")
         return None,None
@@ -96,10 +81,10 @@ def add_suffix(fname, suffix=''):
     return path + suffix + ext
 
 
-def get_tile_bboxs(grid_bbox, dx, dy):
+def get_tile_edges(grid_bbox, dx, dy):
     """
     des:    
-        Define bbox of tiles given bbox of grid and tile size. 
+        Coord of tile edges given bbox of grid and tile size. 
     """
     xmin, xmax, ymin, ymax = grid_bbox
 
@@ -110,78 +95,100 @@ def get_tile_bboxs(grid_bbox, dx, dy):
     # Coord of tile edges for each dimension
     xg = np.linspace(xmin, xmax, New)   
     yg = np.linspace(ymin, ymax, Nns)
-    
+    return xg, yg
+
+def get_tile_bboxs(grid_bbox, dx, dy):
+    """
+    des:    
+        Define bbox of tiles given bbox of grid and tile size. 
+    """
+    xg, yg = get_tile_edges(grid_bbox, dx, dy)
     # Vector of bbox for each tile   ##NOTE: Nested loop!
     bboxs = [(w,e,s,n) for w, e in zip(xg[:-1], xg[1:]) 
                        for s, n in zip(yg[:-1], yg[1:])]
     del xg, yg
     return bboxs
 
-def get_tile_data(ifile, x, y, bbox, buff=1, proj='3031', tile_num=0):
+def get_tile_ids(x, y, xg, yg, buff=0):
+    """
+    des:
+        Tile id of each point (tile order is same to get_tile_bboxs), 
+        one point can belong to multiple tiles in the buffer (overlap) region. 
+    args:
+        x, y: coordinates of the points.
+        xg, yg: coord of the tile edges (get_tile_edges).
+        buff: buffer of the tiles, unit is same to x, y.
+    return:
+        ipts: index of the points.
+        tile_ids: tile id (0-based) corresponding to ipts.
+    """
+    # tile range of each point: tile i contains x if xg[i]-buff <= x <= xg[i+1]+buff
+    col_min = np.searchsorted(xg[1:], x - buff, side='left')
+    col_max = np.searchsorted(xg[:-1], x + buff, side='right') - 1
+    row_min = np.searchsorted(yg[1:], y - buff, side='left')
+    row_max = np.searchsorted(yg[:-1], y + buff, side='right') - 1
+    num_row = np.clip(row_max - row_min + 1, 0, None)
+    num = np.clip(col_max - col_min + 1, 0, None) * num_row
+    # expand the points to (point, tile) pairs
+    ipts = np.repeat(np.arange(len(x)), num)
+    k = np.arange(len(ipts)) - np.repeat(np.cumsum(num) - num, num)
+    cols = col_min[ipts] + k // num_row[ipts]
+    rows = row_min[ipts] + k % num_row[ipts]
+    tile_ids = cols * (len(yg) - 1) + rows
+    return ipts, tile_ids
+
+def write_tile(ofile, data, tile_num=0, attrs={}):
     """ 
     des:
-        Extract data within bbox and save to individual file. 
+        Save the data of one tile to individual file. 
     args:
-        buff: unit is meter. 
+        ofile: output file.
+        data: dict, variables of the tile.
+        attrs: dict, attributes of the variables, e.g., {'x': {'epsg': 3031}}.
     """
-    chunks=100000
-    print("x 的长度：", len(x))
-    print("y 的长度：", len(y))
-    xmin, xmax, ymin, ymax = bbox   # given region
+    with h5py.File(ofile, 'w') as out_f:
+        for key, value in data.items():
+            out_f.create_dataset(key, data=value)
+            out_f[key].attrs.update(attrs.get(key, {}))
+    print(('tile %03d: #points' % tile_num, len(list(data.values())[0]), '...'))
 
-    suffix = ('_buff_%g_epsg_%s_tile_%03d' % (buff, proj, tile_num))
-    ofile = add_suffix(ifile, suffix)
+def split_file(ifile, x, y, xg, yg, buff=1, proj='3031', njobs=1):
+    """ 
+    des:
+        Split the file into tiles in one pass: the tile ids of the points are computed once, 
+        the points are sorted by tile id, and all the tiles are written from one read of the file. 
+    args:
+        x, y: projected coordinates of the points in ifile.
+        xg, yg: coord of the tile edges (get_tile_edges).
+        buff: unit is km. 
+        njobs: number of jobs for parallel writing of the tiles.
+    return:
+        number of the written tiles.
+    """
+    ipts, tile_ids = get_tile_ids(x, y, xg, yg, buff*1e3)
+    isort = np.argsort(tile_ids, kind='stable')
+    ipts, tile_ids = ipts[isort], tile_ids[isort]
+    starts = np.flatnonzero(np.r_[True, tile_ids[1:] != tile_ids[:-1]]) if len(ipts) else []
+    ends = np.r_[starts[1:], len(ipts)] if len(ipts) else []
 
     with h5py.File(ifile, 'r') as fi:
-        vnames = list(fi.keys())
-        variables = [fi[key][:] for key in vnames ]
-
-    out = {key: [] for key in vnames}
-    npts = 0             # conunt of the written points
-    nrow = x.shape[0]
-
-    # read and write in chunks, i: start of each chunk
-    for i in range(0, nrow, chunks):
-        k = min(i+nrow, nrow)   ## avoid the k exceeds the index range of x.
-        x_chunk = x[i:k]
-        y_chunk = y[i:k]
-
-        # get the tile indices, 
-        idx, = np.where( (x_chunk >= xmin-buff*1e3) & (x_chunk <= xmax+buff*1e3) & 
-                         (y_chunk >= ymin-buff*1e3) & (y_chunk <= ymax+buff*1e3) )
-
-        # Leave chunk if outside tile
-        if len(idx) == 0:
-            continue
-
-        # get chunk of data of the tile
-        vars_chunk = [d[i:k] for d in variables]         # -> obtain the points in the chunk
-        print("vars_chunk:",vars_chunk)
-        vars_chunk_region = [d[idx] for d in vars_chunk]        # -> obtain the points in the given region
-        # print("vars_chunk_region",vars_chunk_region)   
-
-        # Save chunk
-        for (j, key) in enumerate(vnames):
-            # out[key] = out[key] + list(vars_chunk_region[j])
-            out[key].extend(vars_chunk_region[j])
-        npts += vars_chunk_region[0].shape[0]
-    print("最终输出：",out)
-    print("总点数:",npts)
-
-    if npts != 0: 
-        with h5py.File(ofile, 'w') as out_f:
-        # , h5py.File(ifile, 'r') as in_f:
-            for key in vnames:
-                shape_var = variables[vnames.index(key)].shape
-                if len(shape_var) == 1:                        
-                    out_f.create_dataset(key, (npts,), dtype='float32')
-                    out_f[key][:] = out[key]
-                else:
-                    out_f.create_dataset(key, (npts, shape_var[1]), dtype='float32')
-                    out_f[key][:] = np.array(out[key])
-        print(out_f[key][:].shape) 
-        print(np.array(out[key]).shape) 
-        print(('tile %03d: #points' % tile_num, npts, '...'))
+        variables = {key: fi[key][:] for key in fi.keys()}
+        attrs = {key: dict(fi[key].attrs) for key in fi.keys()}
+
+    def tiles():
+        for i1, i2 in zip(starts, ends):
+            tile_num = tile_ids[i1] + 1
+            suffix = ('_buff_%g_epsg_%s_tile_%03d' % (buff, proj, tile_num))
+            idx = ipts[i1:i2]
+            yield add_suffix(ifile, suffix), {key: d[idx] for key, d in variables.items()}, tile_num
+
+    if njobs == 1:
+        for ofile, data, tile_num in tiles():
+            write_tile(ofile, data, tile_num, attrs)
+    else:
+        Parallel(n_jobs=njobs, verbose=5)(
+            delayed(write_tile)(ofile, data, tile_num, attrs) for ofile, data, tile_num in tiles())
+    return len(starts)
 
 def count_files(ifiles, key='*tile*'):
     saved = []
@@ -204,39 +211,33 @@ if __name__ == '__main__':
     dx, dy = args.dxy[0], args.dxy[1]
     proj = args.proj[0]
     njobs = args.njobs[0]
+    catalog = args.catalog[0]
 
     print_args(args)
 
     if len(ifiles) == 1:
         ifiles = glob(ifiles[0])
+    if catalog:
+        ifiles = select_files(catalog, ifiles, extent=bbox_ if bbox_[0] else None, proj=proj)
 
-    print('generating list of tasks (files x tiles) ...')
-
-    xys = [get_xy(f, coord_name, proj) for f in ifiles]
+    xys = [get_xy(f, coord_name, proj, njobs) for f in ifiles]
+    ifiles = [f for f, (x, y) in zip(ifiles, xys) if x is not None]
+    xys = [(x, y) for x, y in xys if x is not None]
 
     if not bbox_[0]:
-        xy = np.vstack(xys)
-        xmin, ymin = np.min(xy, axis=0)  # 修正axis为0以确保正确的最小值
-        xmax, ymax = np.max(xy, axis=0)  # 修正axis为0以确保正确的最大值
+        xmin = min([np.nanmin(x) for x, y in xys])
+        xmax = max([np.nanmax(x) for x, y in xys])
+        ymin = min([np.nanmin(y) for x, y in xys])
+        ymax = max([np.nanmax(y) for x, y in xys])
         bbox_ = [xmin, xmax, ymin, ymax]
-        
-    bboxs = get_tile_bboxs(bbox_, dx, dy)                                   ##[b1,b2]
 
-    fxys = [(f, x, y) for f, (x, y) in zip(ifiles, xys)]                   ##[(f1,x1,y1),(f2,x2,y2)...]
-    fxybs = [(f, x, y, b, n+1) for (f, x, y) in fxys for n, b in enumerate(bboxs)]              ##[(f1,x1,y1,b1,1),(f2,x2,y2,b2,2)...]
+    xg, yg = get_tile_edges(bbox_, dx, dy)
 
     print(f'number of files: {len(ifiles)}')
-    print(f'number of tiles: {len(bboxs)}')
-    print(f'number of tasks: {len(fxybs)}')
-
-    if njobs == 1:
-        print('running sequential code ...')
-        for f, x, y, b, n in fxybs:
-            get_tile_data(f, x, y, b, bf, proj, n)
-    else:
-        print(f'running parallel code ({njobs} jobs) ...')
-        Parallel(n_jobs=njobs, verbose=5)(
-            delayed(get_tile_data)(f, x, y, b, bf, proj, n) for f, x, y, b, n in fxybs
-        )
+    print(f'number of tiles: {(len(xg) - 1) * (len(yg) - 1)}')
 
+    for i, (f, (x, y)) in enumerate(zip(ifiles, xys)):
+        print(f'splitting file: {f}')
+        split_file(f, x, y, xg, yg, bf, proj, njobs)
+        xys[i] = None
     print(f'number of tiles with data: {count_files(ifiles)}')
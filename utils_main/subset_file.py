@@ -1,20 +1,27 @@
 ## author: xin luo
-## create: 2021.8.30; modify: 2022.10.19
-## des: subset file (!!!h5 file packaged Dictionary data) with given extent, or mask image, or time range.
+## create: 2021.8.30; modify: 2022.10.19; 2026.10.18
+## des: subset file (!!!h5 file packaged Dictionary data) with given extent, or mask image, or polygons, or time range.
 
 '''
 example:
     python subset_icesat.py ./input/path/*.h5 -r 90 91 30 31 -t 2008.1 2008.4 -c lon lat -tn t_dyr
     python subset_icesat.py ./input/path/*.h5 -m ./data/mask.tif -t 2008.1 2008.4 -c lon lat -tn t_dyr
+    python subset_icesat.py ./input/path/*.h5 -g ./data/lake.gpkg -t 2019 2023 -c lon lat -tn t_dyr
+    python subset_icesat.py ./input/path/*.h5 -r 90 91 30 31 -cat ./input/path/catalog.db
 '''
 
 import os
+import sys
 import h5py 
 import argparse
 import numpy as np
 from osgeo import gdal
 from osgeo import osr
-from glob import glob
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.polygon_mask import read_polygon, points_in_polygon
+from utils.transform_xy import coor2coor, geo2imagexy
+from utils.geotif_io import read_block
+from readout_catalog import select_files
 
 def get_args():
 
@@ -44,66 +51,76 @@ def get_args():
             '-tn', metavar=('time_name'), dest='time_name', type=str, nargs=1,
             help=('name of time variables'),
             default=['t_dyr'])
+    parser.add_argument(
+            '-g', metavar=('vector_file'), dest='vector_file', type=str, nargs=1,
+            help=('vector file (.gpkg/.shp) of polygons for data subset'),
+            default=[None])
+    parser.add_argument(
+            '-cat', metavar=('catalog'), dest='catalog', type=str, nargs=1,
+            help=('footprint catalog (sqlite, by readout_catalog.py) for selecting the candidate files'),
+            default=[None])
 
     return parser.parse_args()
 
 
-def geo2imagexy(x, y, gdal_trans):
+def open_mask(path_mask):
     '''
-    des: from georeferenced location (i.e., lon, lat) to image location(col,row).
-    input:
-        gdal_proj: obtained by gdal.Open() and .GetGeoTransform(), or by geotif_io.readTiff()['geotrans']
-        x: project or georeferenced x, i.e.,lon
-        y: project or georeferenced y, i.e., lat
+    des: open the mask image without reading the pixels.
     return: 
-        image col and row corresponding to the georeferenced location.
+        extent_mask: [gdal dataset, geotrans_gdal]
     '''
-    a = np.array([[gdal_trans[1], gdal_trans[2]], [gdal_trans[4], gdal_trans[5]]])
-    b = np.array([x - gdal_trans[0], y - gdal_trans[3]])
-    col_img, row_img = np.linalg.solve(a, b)
-    col_img, row_img = np.floor(col_img).astype('int'), np.floor(row_img).astype('int')
-    return row_img, col_img
-
-### tiff image reading
-def readTiff(path_in):
+    ds_mask = gdal.Open(path_mask)
+    return [ds_mask, ds_mask.GetGeoTransform()]
+
+def mask_points(lon, lat, extent_mask, cache_size=16):
     '''
-    return: 
-        img: numpy array, exent: tuple, (x_min, x_max, y_min, y_max) 
-        proj info, and dimentions: (row, col, band)
+    des: mask values at the points, only the image blocks containing points are read.
+    args:
+        lon, lat: wgs84 coordinates of the points.
+        extent_mask: [gdal dataset, geotrans_gdal], e.g., by open_mask().
+        cache_size: max number of the blocks kept in the block cache.
+    return:
+        keep: bool array, True for the points located at non-zero mask pixels.
     '''
-    RS_Data=gdal.Open(path_in)
-    im_col = RS_Data.RasterXSize  # 
-    im_row = RS_Data.RasterYSize  # 
-    im_bands =RS_Data.RasterCount  # 
-    im_geotrans = RS_Data.GetGeoTransform()  # 
-    im_proj = RS_Data.GetProjection()  # 
-    img_array = RS_Data.ReadAsArray(0, 0, im_col, im_row)  # 
-    left = im_geotrans[0]
-    up = im_geotrans[3]
-    right = left + im_geotrans[1] * im_col + im_geotrans[2] * im_row
-    bottom = up + im_geotrans[5] * im_row + im_geotrans[4] * im_col
-    extent = (left, right, bottom, up)
-    espg_code = osr.SpatialReference(wkt=im_proj).GetAttrValue('AUTHORITY',1)
-
-    img_info = {'geoextent': extent, 'geotrans':im_geotrans, \
-                'geosrs': espg_code, 'row': im_row, 'col': im_col,\
-                    'bands': im_bands}
-
-    if im_bands > 1:
-        img_array = np.transpose(img_array, (1, 2, 0)).astype(np.float)  # 
-        return img_array, img_info 
-    else:
-        return img_array, img_info
+    ds_mask, geotrans = extent_mask
+    epsg = osr.SpatialReference(wkt=ds_mask.GetProjection()).GetAttrValue('AUTHORITY',1)
+    x, y = lon, lat
+    if epsg is not None and int(epsg) != 4326:
+        x, y = coor2coor(4326, epsg, lon, lat)
+    keep = np.zeros(np.shape(lon), dtype=bool)
+    idx_valid, = np.where(np.isfinite(x) & np.isfinite(y))
+    row, col = geo2imagexy(x[idx_valid], y[idx_valid], geotrans)
+    inside = (row >= 0) & (row < ds_mask.RasterYSize) & (col >= 0) & (col < ds_mask.RasterXSize)
+    idx_valid, row, col = idx_valid[inside], row[inside], col[inside]
+    if len(idx_valid) == 0:
+        return keep
+    ## group the points by block, each block is read once.
+    band = ds_mask.GetRasterBand(1)
+    bw, bh = band.GetBlockSize()
+    i_row, i_col = row // bh, col // bw
+    block_id = i_row * ((ds_mask.RasterXSize + bw - 1) // bw) + i_col
+    isort = np.argsort(block_id, kind='stable')
+    start = np.flatnonzero(np.r_[True, np.diff(block_id[isort]) != 0])
+    for i1, i2 in zip(start, np.r_[start[1:], len(isort)]):
+        ipts = isort[i1:i2]
+        block = read_block(band, i_row[ipts[0]], i_col[ipts[0]], (bh, bw), 
+                                name=ds_mask.GetDescription(), cache_size=cache_size)
+        keep[idx_valid[ipts]] = block[row[ipts] - i_row[ipts[0]] * bh, 
+                                      col[ipts] - i_col[ipts[0]] * bw] != 0
+    return keep
 
 def subset(ifile, extent=[None, None, None, None], time_range=[None, None], 
-           extent_mask=[None, None], time_name=None, coord_name=['h_lon', 'h_lat']):
+           extent_mask=[None, None], time_name=None, coord_name=['h_lon', 'h_lat'], polygon=None):
     '''args:
         ifile: input file path
         extent: [lon_min, lon_max, lat_min, lat_max], the extent points should be wgs84 coordinate.
         time_range: [time_start, time_end]
-        extent_mask: [raster_mask, geotrans_gdal]
+        extent_mask: [gdal dataset, geotrans_gdal], by open_mask(), the points located 
+                     at non-zero mask pixels are selected.
         time_name: attribute name for time in h5 file
         coord_name: [attribute name for lon, attribute name for lat]
+        polygon: shapely geometry (wgs84), e.g., read by read_polygon(), the points within 
+                 the polygon are selected.
     '''
     print('input -> ', ifile)
     lon_name, lat_name = coord_name
@@ -116,45 +133,40 @@ def subset(ifile, extent=[None, None, None, None], time_range=[None, None],
     with h5py.File(ifile, 'r') as fi:
         vnames = list(fi.keys())
         vars = [fi[vname][:] for vname in vnames]
+        attrs = {vname: dict(fi[vname].attrs) for vname in vnames}
     vars_dict = dict(zip(vnames, vars))
+    lon, lat = vars_dict[lon_name], vars_dict[lat_name]
+    keep = np.ones(lon.shape, dtype=bool)
 
-    # Debugging: Print shapes of lon and lat arrays
-    print(f"Shape of {lon_name}: {vars_dict[lon_name].shape}")
-    print(f"Shape of {lat_name}: {vars_dict[lat_name].shape}")
-
-    idx_extent = None
     # 1) If extent is given
     if extent[0] is not None:
         lonmin, lonmax, latmin, latmax = extent  # given region
-        idx_extent = np.where((vars_dict[lon_name] >= lonmin) & (vars_dict[lon_name] <= lonmax) & 
-                              (vars_dict[lat_name] >= latmin) & (vars_dict[lat_name] <= latmax))
-
-        # Debugging: Print the number of points selected by extent
-        print(f"Number of points within extent: {len(idx_extent[0])}")
+        keep &= (lon >= lonmin) & (lon <= lonmax) & (lat >= latmin) & (lat <= latmax)
+        print(f"Number of points within extent: {keep.sum()}")
 
-    idx_time = None
     # 2) If time_range is given
     if time_range[0] is not None and time_name is not None:
         time_start, time_end = time_range
-        idx_time = np.where((vars_dict[time_name] >= time_start) & (vars_dict[time_name] <= time_end))
-
-        # Debugging: Print the number of points selected by time range
-        print(f"Number of points within time range: {len(idx_time[0])}")
-
-    # 3) Subset variables
+        keep &= (vars_dict[time_name] >= time_start) & (vars_dict[time_name] <= time_end)
+        print(f"Number of points within time range: {keep.sum()}")
+
+    # 3) If polygon is given (only the points remained are tested)
+    if polygon is not None:
+        idx_keep, = np.where(keep)
+        keep[idx_keep] = points_in_polygon(lon[idx_keep], lat[idx_keep], polygon)
+        print(f"Number of points within polygon: {keep.sum()}")
+
+    # 4) If mask image is given (only the points remained are tested)
+    if extent_mask[0] is not None:
+        idx_keep, = np.where(keep)
+        keep[idx_keep] = mask_points(lon[idx_keep], lat[idx_keep], extent_mask)
+        print(f"Number of points within mask: {keep.sum()}")
+
+    # 5) Subset variables
     for vname in vnames:
-        # Debugging: Print shape before subsetting
-        print(f"Shape of {vname} before subsetting: {vars_dict[vname].shape}")
-
         # Ensure the variable has the same shape as the coordinate arrays
-        if vars_dict[vname].shape == vars_dict[lon_name].shape:
-            if idx_extent is not None:
-                vars_dict[vname] = vars_dict[vname][idx_extent]
-            if idx_time is not None:
-                vars_dict[vname] = vars_dict[vname][idx_time]
-
-            # Debugging: Print shape after subsetting
-            print(f"Shape of {vname} after subsetting: {vars_dict[vname].shape}")
+        if vars_dict[vname].shape[:1] == lon.shape:
+            vars_dict[vname] = vars_dict[vname][keep]
         else:
             print(f"Skipping {vname} due to shape mismatch: {vars_dict[vname].shape}")
 
@@ -162,6 +174,7 @@ def subset(ifile, extent=[None, None, None, None], time_range=[None, None],
     with h5py.File(ofile, 'w') as fo:
         for vname in vnames:
             fo.create_dataset(vname, data=vars_dict[vname])
+            fo[vname].attrs.update(attrs[vname])
 
     print(('output ->', ofile))
 
@@ -176,15 +189,23 @@ if __name__ == '__main__':
     coord_name = args.coord_name[:]
     time_range = args.time_range     # bounding box EPSG (m) or geographical (deg)
     time_name = args.time_name[0]   
+    vector_file = args.vector_file[0]
+    catalog = args.catalog[0]
 
     print('Input arguments:')
     for arg in list(vars(args).items()):
         print(arg)
     if mask_path[0]:
-        mask_raster, mask_info = readTiff(mask_path[0])
-        extent_mask = [mask_raster, mask_info['geotrans']]
+        extent_mask = open_mask(mask_path[0])
     else:
         extent_mask = [None, None]
+    polygon = read_polygon(vector_file) if vector_file else None
+    if catalog:
+        extent_cat = extent if extent[0] is not None else None
+        if polygon is not None:
+            extent_cat = [polygon.bounds[0], polygon.bounds[2], polygon.bounds[1], polygon.bounds[3]]
+        ifiles = select_files(catalog, ifiles, extent=extent_cat, time_range=time_range)
+        print('number of candidate files:', len(ifiles))
 
     [subset(f, extent, time_range, \
-                    extent_mask, time_name, coord_name) for f in ifiles]
\ No newline at end of file
+                    extent_mask, time_name, coord_name, polygon) for f in ifiles]
\ No newline at end of file
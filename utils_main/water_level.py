@@ -0,0 +1,149 @@
+## author: xin luo
+## create: 2026.10.18
+## des: lake water level time series (one level for each pass) from the atl13 readout files,
+##      for one lake or all lakes of an inventory (in one pass over the points).
+
+'''
+des: 1. read the atl13 points (within the lake polygon) of the readout files. with -f,
+        each polygon of the vector file is one lake, and each point is assigned to
+        its lake by the str-tree of the polygons.
+     2. quality flag filtering, latitude-band percentile filtering (-b),
+        iqr+mad outlier removal and robust level of each pass, see utils/lake_level.py.
+     3. the levels are written to a csv file (t_dyr, date, h, h_std, h_se, npts, rgt,
+        and lake_id with -f), the levels are grouped by lake and ordered by time.
+example:
+    python water_level.py ./readout/ATL13_*_readout.h5 -g ./data/namco.gpkg -o ./namco_level.csv
+    python water_level.py ./readout/ATL13_*_readout.h5 -g ./data/namco.gpkg -o ./namco_level.csv -b 0.1 62 -s 2
+    python water_level.py ./readout/ATL13_*_readout.h5 -g ./data/lakes_tp.gpkg -f lake_id -o ./lakes_level.csv
+'''
+
+import os
+import sys
+import h5py
+import argparse
+import numpy as np
+import pandas as pd
+from glob import glob
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.polygon_mask import read_polygon, points_in_polygon, read_polygons, assign_polygons
+from utils.lake_level import quality_mask, lake_levels
+from utils.time_convert import dyr2dt64
+
+# variables used for the water level
+vars_level = ['lon', 'lat', 't_dyr', 'h', 'rgt', 'qf_bckgrd',
+                'qf_bias_em', 'qf_bias_fit', 'stdev_water_surf']
+
+def get_args():
+    """ Get command-line arguments. """
+    parser = argparse.ArgumentParser(
+            description='lake water level of each pass from atl13 readout files')
+    parser.add_argument(
+            'ifiles', metavar='ifiles', type=str, nargs='+',
+            help='atl13 readout files (HDF5)')
+    parser.add_argument(
+            '-o', metavar='ofile', dest='ofile', type=str, nargs=1,
+            help='output file (csv)',
+            required=True)
+    parser.add_argument(
+            '-g', metavar=('vector_file'), dest='vector_file', type=str, nargs=1,
+            help=('vector file (.gpkg/.shp) of the lake polygon, None: all points are used'),
+            default=[None])
+    parser.add_argument(
+            '-f', metavar=('id_field'), dest='id_field', type=str, nargs=1,
+            help=('field of the lake ids, if given, the levels of each lake (polygon) are computed'),
+            default=[None])
+    parser.add_argument(
+            '-b', metavar=('interval', 'percentile'), dest='band', type=float, nargs=2,
+            help=('latitude interval (degree) and percentile (0-100) of the band filtering'),
+            default=[None, None])
+    parser.add_argument(
+            '-s', metavar=('stdev_max'), dest='stdev_max', type=float, nargs=1,
+            help=('max stdev_water_surf (m) of the points'),
+            default=[2])
+    parser.add_argument(
+            '-k', metavar=('k_iqr', 'k_mad'), dest='k_iqr_mad', type=float, nargs=2,
+            help=('scale of the iqr and mad for the outlier removal'),
+            default=[1.5, 3])
+    parser.add_argument(
+            '-m', metavar=('min_pts'), dest='min_pts', type=int, nargs=1,
+            help=('min number of points of a pass'),
+            default=[5])
+    return parser.parse_args()
+
+
+def read_points(ifiles, polygon=None, tree=None, vnames=vars_level):
+    """
+    des: read the points (within the polygon, or within the polygons of the tree) of the readout files.
+    args:
+        ifiles: atl13 readout files.
+        polygon: shapely geometry (wgs84), None: all the points are read.
+        tree: shapely.STRtree of the lake polygons (wgs84), e.g., by read_polygons(), 
+              the points are assigned to the polygons ('ipoly': index of the tree geometries).
+        vnames: variables to read.
+    return:
+        points: dict, {variable: 1-d array}
+    """
+    points = {vname: [] for vname in vnames + (['ipoly'] if tree is not None else [])}
+    for ifile in ifiles:
+        with h5py.File(ifile, 'r') as fi:
+            if tree is not None:
+                ipoly = assign_polygons(fi['lon'][:], fi['lat'][:], tree)
+                idx = ipoly >= 0
+                points['ipoly'].append(ipoly[idx])
+            elif polygon is not None:
+                idx = points_in_polygon(fi['lon'][:], fi['lat'][:], polygon)
+            else:
+                idx = slice(None)
+            if isinstance(idx, np.ndarray) and not idx.any():
+                continue
+            for vname in vnames:
+                points[vname].append(fi[vname][:][idx])
+    return {vname: np.concatenate(value) if value else np.array([])
+                                            for vname, value in points.items()}
+
+
+def levels_to_df(levels):
+    """ des: levels (dict) to dataframe, the date (utc) of each level is added. """
+    levels_df = pd.DataFrame(levels)
+    levels_df.insert(1, 'date', dyr2dt64(levels_df['t_dyr'].values, 's'))
+    return levels_df
+
+
+if __name__ == '__main__':
+
+    args = get_args()
+    ifiles = args.ifiles[:]
+    ofile = args.ofile[0]
+    vector_file = args.vector_file[0]
+    id_field = args.id_field[0]
+    band = args.band if args.band[0] is not None else None
+    stdev_max = args.stdev_max[0]
+    k_iqr, k_mad = args.k_iqr_mad
+    min_pts = args.min_pts[0]
+
+    if len(ifiles) == 1:
+        ifiles = glob(ifiles[0])
+    ifiles = sorted(ifiles)
+
+    polygon, tree, lake = None, None, None
+    if vector_file and id_field:
+        tree, lake_ids = read_polygons(vector_file, id_field)
+        print('number of lakes:', len(lake_ids))
+    elif vector_file:
+        polygon = read_polygon(vector_file)
+    points = read_points(ifiles, polygon, tree)
+    if tree is not None:
+        lake = points['ipoly'].astype(np.int64)
+    print('number of points:', len(points['h']))
+    keep = quality_mask(points['qf_bckgrd'], points['qf_bias_em'], points['qf_bias_fit'],
+                                    points['stdev_water_surf'], stdev_max=stdev_max)
+    print('number of points with good quality:', keep.sum())
+    levels = lake_levels(points['t_dyr'], points['h'], points['lat'], points['rgt'],
+                            keep=keep, band=band, k_iqr=k_iqr, k_mad=k_mad, min_pts=min_pts, lake=lake)
+    if tree is not None:
+        levels[id_field] = lake_ids[levels.pop('lake')]
+        print('number of lakes with levels:', len(np.unique(levels[id_field])))
+    levels_df = levels_to_df(levels)
+    levels_df.to_csv(ofile, index=False)
+    print('number of passes:', len(levels_df))
+    print('output ->', ofile)
@@ -0,0 +1,285 @@
+## author: xin luo
+## create: 2026.10.18
+## des: build a mission-wide crossover catalog from many readout files (*_readout.h5).
+
+'''
+des: 1. summary the footprint (bbox and time span) of the ascending/descending
+        points of each readout file.
+     2. select the ascending/descending pairs whose footprints overlap.
+     3. find the crossovers of the selected pairs (in parallel).
+     4. append the crossovers to one chunked columnar catalog (h5 file, 1-d datasets),
+        the processed pairs (with or without crossovers) are recorded in the 'pairs_done' 
+        group and skipped when the catalog is updated. the failed pairs are reported 
+        at the end (exit code 1) and processed again by the next run.
+example:
+    python xover_catalog.py ./readout/*_readout.h5 -o ./xover_catalog.h5 -p 3031 -n 8
+    python xover_catalog.py ./readout/*_readout.h5 -o ./xover_catalog.h5 -p 3031 -d 20 20 -r 2 -t 0.25
+'''
+
+import os
+import sys
+import h5py
+import argparse
+import numpy as np
+from glob import glob
+from joblib import Parallel, delayed
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.xover_icesat2 import xover_icesat2
+from add_xy import read_xy
+
+# columns of the crossover catalog
+xover_keys = ['o_lon', 'o_lat', 'oh_as', 'oh_des', 'ot_as', 'ot_des',
+                        'ospot_as', 'ospot_des', 'oh_dif', 'ot_dif']
+
+def get_args():
+    """ Get command-line arguments. """
+    parser = argparse.ArgumentParser(
+            description='build crossover catalog from multiple readout files')
+    parser.add_argument(
+            'ifiles', metavar='ifiles', type=str, nargs='+',
+            help='readout files (HDF5)')
+    parser.add_argument(
+            '-o', metavar='ofile', dest='ofile', type=str, nargs=1,
+            help='output crossover catalog (HDF5), crossovers are appended if it exists',
+            required=True)
+    parser.add_argument(
+            '-p', metavar=('epsg_num'), dest='proj', type=str, nargs=1,
+            help=('EPSG proj number (AnIS=3031, GrIS=3413)'),
+            default=['3031'],)
+    parser.add_argument(
+            '-d', metavar=('dx', 'dy'), dest='tile_dxy', type=float, nargs=2,
+            help=('tile size for the crossover searching (km)'),
+            default=[20, 20],)
+    parser.add_argument(
+            '-r', metavar=('buffer'), dest='buff', type=float, nargs=1,
+            help=('buffer of the tile and the footprint (km)'),
+            default=[2],)
+    parser.add_argument(
+            '-t', metavar=('dt_max'), dest='dt_max', type=float, nargs=1,
+            help=('max time separation of the paired files (same unit as time variable)'),
+            default=[None],)
+    parser.add_argument(
+            '-c', metavar=('lon','lat'), dest='coord_name', type=str, nargs=2,
+            help=('name of lon/lat variables'),
+            default=['lon', 'lat'])
+    parser.add_argument(
+            '-v', metavar=('time', 'height', 'spot', 'orbit_type'), dest='var_name', type=str, nargs=4,
+            help=('name of time/height/spot/orbit type variables'),
+            default=['t_dyr', 'h', 'spot', 'orbit_type'])
+    parser.add_argument(
+            '-n', metavar=('njobs'), dest='njobs', type=int, nargs=1,
+            help="number of cores to use for parallel processing",
+            default=[1],)
+    return parser.parse_args()
+
+
+def get_footprint(ifile, proj='3031', coord_name=['lon', 'lat'],
+                        time_name='t_dyr', orbit_name='orbit_type'):
+    """
+    des: footprint of the ascending (orbit_type=1) and descending (orbit_type=0) points.
+    arg:
+        ifile: readout file (h5).
+        proj: epsg number of the projection where the bbox is computed.
+        coord_name, time_name, orbit_name: variable names in the readout file.
+    return:
+        footprint: list of [orbit_type, xmin, xmax, ymin, ymax, tmin, tmax, npts]
+    """
+    with h5py.File(ifile, 'r') as fi:
+        x, y = read_xy(fi, proj, coord_name)
+        t, orbit = fi[time_name][:], fi[orbit_name][:]
+    footprint = []
+    for orbit_type in [1, 0]:
+        idx = (orbit == orbit_type) & np.isfinite(x) & np.isfinite(y)
+        if not idx.any():
+            continue
+        footprint.append([orbit_type, x[idx].min(), x[idx].max(), y[idx].min(), y[idx].max(),
+                                        np.nanmin(t[idx]), np.nanmax(t[idx]), idx.sum()])
+    return footprint
+
+
+def overlap_pairs(fp_as, fp_des, buff=0, dt_max=None):
+    """
+    des: select the ascending/descending footprints pairs with overlapped bbox.
+    arg:
+        fp_as, fp_des: (n, 6) arrays, [xmin, xmax, ymin, ymax, tmin, tmax] of footprints.
+        buff: buffer of the bbox, unit is same to the bbox.
+        dt_max: max time separation between the two footprints, None: no constraint.
+    return:
+        i_as, i_des: indices of the ascending and descending footprints of the pairs.
+    """
+    fp_as, fp_des = np.asarray(fp_as).reshape(-1, 6), np.asarray(fp_des).reshape(-1, 6)
+    # sweep in x: descending footprints sorted by xmin
+    isort = np.argsort(fp_des[:, 0], kind='stable')
+    fp_des = fp_des[isort]
+    hi = np.searchsorted(fp_des[:, 0], fp_as[:, 1] + 2*buff, side='right')
+    i_as, i_des = [], []
+    for i in range(len(fp_as)):
+        cand = fp_des[:hi[i]]
+        keep = (cand[:, 1] + 2*buff >= fp_as[i, 0]) & \
+                (cand[:, 2] <= fp_as[i, 3] + 2*buff) & (cand[:, 3] + 2*buff >= fp_as[i, 2])
+        if dt_max is not None:
+            keep &= (cand[:, 4] <= fp_as[i, 5] + dt_max) & (cand[:, 5] + dt_max >= fp_as[i, 4])
+        j, = np.where(keep)
+        i_as.append(np.full(len(j), i))
+        i_des.append(isort[j])
+    if len(i_as) == 0:
+        return np.array([], dtype=int), np.array([], dtype=int)
+    return np.concatenate(i_as).astype(int), np.concatenate(i_des).astype(int)
+
+
+def read_orbit(ifile, orbit_type, coord_name, var_name, proj='3031'):
+    """ des: read lon, lat, time, height and spot of the points of given orbit type,
+             and their x/y (epsg: proj, the stored x/y are reused).
+    """
+    time_name, h_name, spot_name, orbit_name = var_name
+    with h5py.File(ifile, 'r') as fi:
+        idx = fi[orbit_name][:] == orbit_type
+        pts = [fi[key][:][idx] for key in list(coord_name) + [time_name, h_name, spot_name]]
+        x, y = read_xy(fi, proj, coord_name)
+    return pts, (x[idx], y[idx])
+
+
+def xover_pair(file_as, file_des, proj, tile_dxy, buff, coord_name, var_name):
+    """
+    des: crossovers between the ascending points of file_as and
+         the descending points of file_des.
+    return:
+        out: dict of the crossover variables, or None if no crossover is found.
+        error: error message if the pair failed, otherwise None.
+    """
+    try:
+        pts_as, xy_as = read_orbit(file_as, 1, coord_name, var_name, proj)
+        pts_des, xy_des = read_orbit(file_des, 0, coord_name, var_name, proj)
+        out_df = xover_icesat2(*pts_as, *pts_des, proj=proj, tile_dxy=list(tile_dxy), 
+                                    buff=buff, xy_as=xy_as, xy_des=xy_des)
+    except Exception as e:
+        return None, f'{type(e).__name__}: {e}'
+    if out_df is None or len(out_df) == 0:
+        return None, None
+    return {key: out_df[key].values for key in xover_keys}, None
+
+
+def append_dataset(group, key, value, chunk=100000):
+    """ des: append the values to the chunked, compressed and resizable 1-d dataset. """
+    if key not in group:
+        group.create_dataset(key, shape=(0,), maxshape=(None,), dtype=value.dtype,
+                            chunks=(chunk,), compression='gzip', shuffle=True)
+    dset = group[key]
+    n0 = dset.shape[0]
+    dset.resize((n0 + len(value),))
+    dset[n0:] = value
+
+
+def append_catalog(ofile, outs, pairs, chunk=100000):
+    """
+    des: append crossovers to the catalog, each variable is saved as a chunked,
+         compressed and resizable 1-d dataset. the file names are saved in the
+         'granules' attribute, and the 'ifile_as'/'ifile_des' variables are
+         the indices of the paired files in the 'granules'. all the pairs (with or
+         without crossovers) are recorded in the 'pairs_done' group.
+    arg:
+        ofile: the catalog file.
+        outs: list of dict (or None), crossovers of the processed pairs.
+        pairs: list of (file_as, file_des), corresponding to outs.
+    return:
+        num: number of the appended crossovers.
+    """
+    num = 0
+    with h5py.File(ofile, 'a', libver='latest') as fo:
+        granules = [str(g) for g in fo.attrs.get('granules', [])]
+        granule_id = {g: i for i, g in enumerate(granules)}
+        for out, (file_as, file_des) in zip(outs, pairs):
+            for f in (file_as, file_des):
+                if f not in granule_id:
+                    granule_id[f] = len(granules)
+                    granules.append(f)
+            if out is None:
+                continue
+            n = len(out['o_lon'])
+            out = dict(out)
+            out['ifile_as'] = np.full(n, granule_id[file_as], dtype=np.int32)
+            out['ifile_des'] = np.full(n, granule_id[file_des], dtype=np.int32)
+            for key, value in out.items():
+                append_dataset(fo, key, value, chunk)
+            num += n
+        group = fo.require_group('pairs_done')
+        for key, i_pair in zip(['ifile_as', 'ifile_des'], [0, 1]):
+            append_dataset(group, key, np.array([granule_id[pair[i_pair]] for pair in pairs],
+                                                            dtype=np.int32), chunk)
+        fo.attrs['granules'] = granules
+    return num
+
+
+def done_pairs(ofile):
+    """ des: (file_as, file_des) pairs already processed, recorded in the 'pairs_done'
+             group, and the pairs with crossovers (catalogs without 'pairs_done'). """
+    if not os.path.exists(ofile):
+        return set()
+    ids = []
+    with h5py.File(ofile, 'r') as fo:
+        granules = [str(g) for g in fo.attrs.get('granules', [])]
+        for group in [fo, fo.get('pairs_done', {})]:
+            if 'ifile_as' in group:
+                ids.append(np.column_stack([group['ifile_as'][:], group['ifile_des'][:]]))
+    if not ids:
+        return set()
+    ids = np.unique(np.concatenate(ids), axis=0)
+    return {(granules[i], granules[j]) for i, j in ids}
+
+
+if __name__ == '__main__':
+
+    args = get_args()
+    ifiles = args.ifiles[:]
+    ofile = args.ofile[0]
+    proj = args.proj[0]
+    tile_dxy = args.tile_dxy[:]
+    buff = args.buff[0]
+    dt_max = args.dt_max[0]
+    coord_name = args.coord_name[:]
+    var_name = args.var_name[:]
+    njobs = args.njobs[0]
+
+    if len(ifiles) == 1:
+        ifiles = glob(ifiles[0])
+    ifiles = sorted(ifiles)
+
+    ### ---- 1. footprints of the files
+    print('computing footprints of %d files ...' % len(ifiles))
+    fps = Parallel(n_jobs=njobs, verbose=5)(
+            delayed(get_footprint)(f, proj, coord_name, var_name[0], var_name[3]) for f in ifiles)
+    files_as, fp_as, files_des, fp_des = [], [], [], []
+    for f, fp in zip(ifiles, fps):
+        for orbit_type, *bbox_time, npts in fp:
+            if orbit_type == 1:
+                files_as.append(f); fp_as.append(bbox_time)
+            else:
+                files_des.append(f); fp_des.append(bbox_time)
+
+    ### ---- 2. pairs with overlapped footprints
+    i_as, i_des = overlap_pairs(fp_as, fp_des, buff=buff*1e3, dt_max=dt_max)
+    pairs = [(files_as[i], files_des[j]) for i, j in zip(i_as, i_des)]
+    print('number of asc/des footprints:', len(fp_as), len(fp_des))
+    print('number of overlapped pairs: %d (of %d)' % (len(pairs), len(fp_as)*len(fp_des)))
+    pairs_done = done_pairs(ofile)
+    pairs = [pair for pair in pairs if pair not in pairs_done]
+    print('number of pairs to process:', len(pairs))
+
+    ### ---- 3/4. crossovers of the pairs, appended to the catalog batch by batch
+    batch = max(njobs * 4, 1)
+    num, failed = 0, []
+    for i in range(0, len(pairs), batch):
+        pairs_batch = pairs[i:i+batch]
+        results = Parallel(n_jobs=njobs)(
+                delayed(xover_pair)(fa, fd, proj, tile_dxy, buff, coord_name, var_name)
+                                                            for fa, fd in pairs_batch)
+        failed += [(pair, error) for pair, (out, error) in zip(pairs_batch, results) if error]
+        done = [(pair, out) for pair, (out, error) in zip(pairs_batch, results) if not error]
+        num += append_catalog(ofile, [out for _, out in done], [pair for pair, _ in done])
+        print('processed pairs: %d/%d, crossovers: %d' % (i+len(pairs_batch), len(pairs), num))
+    print('output ->', ofile)
+    if failed:
+        print('failed pairs: %d (processed again by the next run)' % len(failed))
+        for (file_as, file_des), error in failed:
+            print(f'  {file_as} x {file_des}: {error}')
+        sys.exit(1)